@@ -5,23 +5,47 @@ Creates Pinecone database with CLIP image embeddings
 """
 
 import os
+import hashlib
 import base64
 import json
 import time
-from typing import List, Dict, Optional
+import queue
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+import numpy as np
 import pandas as pd
 from config import Config
+from clip_onnx import ONNX_AVAILABLE, load_clip_onnx_session
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
 
 # Check for required libraries
 try:
     import torch
     import clip
     from PIL import Image
+    from torch.utils.data import Dataset, DataLoader
     CLIP_AVAILABLE = True
 except ImportError:
     CLIP_AVAILABLE = False
     print("❌ CLIP not available. Install with: pip install torch torchvision clip-by-openai")
 
+try:
+    from torchvision.transforms import v2, InterpolationMode
+    GPU_PREPROCESS_AVAILABLE = True
+except ImportError:
+    GPU_PREPROCESS_AVAILABLE = False
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    TURBOJPEG_AVAILABLE = True
+except ImportError:
+    TURBOJPEG_AVAILABLE = False
+
 try:
     from pinecone import Pinecone
     PINECONE_AVAILABLE = True
@@ -29,11 +53,97 @@ except ImportError:
     PINECONE_AVAILABLE = False
     print("❌ Pinecone library not available. Install with: pip install pinecone")
 
+if CLIP_AVAILABLE:
+    class CatalogImageDataset(Dataset):
+        """Decodes and preprocesses catalog images so DataLoader workers can run ahead of the GPU"""
+        
+        def __init__(self, image_paths: List[str], preprocess, input_resolution: int, raw: bool = False):
+            """With raw=True, items are decoded uint8 CHW tensors left for GPU-side preprocessing."""
+            self.image_paths = image_paths
+            self.preprocess = preprocess
+            self.input_resolution = input_resolution
+            self.raw = raw
+            self._turbo = None
+        
+        def __len__(self) -> int:
+            return len(self.image_paths)
+        
+        def _load_image(self, image_path: str) -> "Image.Image":
+            """Decode an image to RGB, using libjpeg-turbo for JPEGs when available."""
+            if TURBOJPEG_AVAILABLE and image_path.lower().endswith(('.jpg', '.jpeg')):
+                try:
+                    # Created lazily so each DataLoader worker gets its own decoder handle
+                    if self._turbo is None:
+                        self._turbo = TurboJPEG()
+                    with open(image_path, 'rb') as f:
+                        return Image.fromarray(self._turbo.decode(f.read(), pixel_format=TJPF_RGB))
+                except Exception:
+                    pass  # Fall back to Pillow (e.g. CMYK or mislabelled files)
+            
+            image = Image.open(image_path)
+            return image if image.mode == 'RGB' else image.convert('RGB')
+        
+        def __getitem__(self, idx: int):
+            """Return (image tensor, index, loaded flag); failed images yield a zero tensor."""
+            try:
+                image = self._load_image(self.image_paths[idx])
+                if self.raw:
+                    return torch.from_numpy(np.asarray(image).copy()).permute(2, 0, 1), idx, True
+                return self.preprocess(image), idx, True
+            except Exception:
+                if self.raw:
+                    return torch.zeros(3, 1, 1, dtype=torch.uint8), idx, False
+                return torch.zeros(3, self.input_resolution, self.input_resolution), idx, False
+    
+    def collate_raw_images(batch):
+        """Collate variable-size raw images into a list instead of stacking them."""
+        images, indices, loaded = zip(*batch)
+        return list(images), torch.tensor(indices), torch.tensor(loaded)
+
 class CLIPImageVectorization:
     """CLIP image vectorization and Pinecone database management for Interior Define Catalog 2"""
     
-    def __init__(self, config: Config = None):
-        """Initialize the CLIP image vectorization system."""
+    # Map item types to their category folder names
+    CATEGORY_FOLDERS = {
+        'sofa': 'sofas',
+        'sofas': 'sofas',
+        'chair': 'chairs',
+        'chairs': 'chairs',
+        'table': 'tables',
+        'tables': 'tables',
+        'bench': 'benches',
+        'benches': 'benches',
+        'nightstand': 'nightstands',
+        'nightstands': 'nightstands',
+        'lighting': 'lighting',
+        'lamp': 'lighting',
+        'rug': 'rugs',
+        'rugs': 'rugs'
+    }
+    
+    IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+    
+    # Turns item names into the underscore form used in image filenames
+    ITEM_NAME_TRANSLATION = str.maketrans({' ': '_', '·': '', ',': '', '(': '', ')': ''})
+    
+    # CLIP ViT-B/32 embedding dimension
+    EMBEDDING_DIM = 512
+    
+    # On-disk CLIP embeddings keyed by image content hash
+    EMBEDDING_CACHE_DIR = os.path.join(".cache", "clip_embeddings")
+    
+    # Connection pool size for parallel async upserts
+    PINECONE_POOL_THREADS = 30
+    
+    def __init__(self, config: Config = None, embed_batch_size: int = 32, upsert_batch_size: int = 100,
+                 backend: str = "torch", use_cache: bool = True, quantize: bool = False):
+        """Initialize the CLIP image vectorization system.
+
+        backend selects the image encoder runtime: "torch" (default) or "onnx"
+        (onnxruntime with TensorRT/CUDA providers when available). use_cache reuses
+        embeddings stored on disk for images whose contents have not changed. quantize
+        runs the image encoder with int8 dynamic quantization on CPU-only hosts.
+        """
         if config is None:
             config = Config()
         
@@ -45,6 +155,23 @@ class CLIPImageVectorization:
         self.clip_model = None
         self.clip_preprocess = None
         self.device = None
+        self.dtype = None
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.compiled = False
+        self.backend = backend
+        self.onnx_session = None
+        self.use_cache = use_cache
+        self.embedding_cache_dir = os.path.join(self.EMBEDDING_CACHE_DIR, "ViT-B-32")
+        self.quantize = quantize
+        self.quantized = False
+        self.gpu_resize = None
+        self.gpu_normalize = None
+        
+        # Category folder contents, scanned once: {folder: {filename: path}} and image file lists
+        self._category_files: Dict[str, Optional[Dict[str, str]]] = {}
+        self._category_images: Dict[str, List[tuple]] = {}
+        self._build_category_index()
         
         # Initialize CLIP model
         self._init_clip()
@@ -65,12 +192,99 @@ class CLIPImageVectorization:
             
             # Load CLIP model
             self.clip_model, self.clip_preprocess = clip.load("ViT-B/32", device=self.device)
+            self.clip_model.eval()
+            
+            # Run in FP16 on GPU so matmuls use Tensor Cores; CPU stays in FP32
+            self.dtype = torch.float16 if self.device == "cuda" else torch.float32
+            if self.device == "cuda":
+                self.clip_model = self.clip_model.half()
             print("✅ CLIP model loaded successfully")
             
+            if self.device == "cpu" and self.quantize and self.backend != "onnx":
+                self._quantize_clip()
+            
+            if self.backend == "onnx":
+                self._init_onnx_backend()
+            else:
+                self._compile_clip()
+                self._init_gpu_preprocess()
+            
         except Exception as e:
             print(f"❌ CLIP initialization failed: {e}")
             self.clip_model = None
     
+    def _quantize_clip(self):
+        """Quantize the CLIP vision encoder's Linear layers to int8 for faster CPU inference."""
+        try:
+            self.clip_model.visual = torch.ao.quantization.quantize_dynamic(
+                self.clip_model.visual, {torch.nn.Linear}, dtype=torch.qint8
+            )
+            self.quantized = True
+            # int8 embeddings drift slightly from FP32 ones, so keep them in a separate cache
+            self.embedding_cache_dir = os.path.join(self.EMBEDDING_CACHE_DIR, "ViT-B-32-int8")
+            print("✅ CLIP image encoder quantized to int8")
+            
+        except Exception as e:
+            print(f"⚠️  int8 quantization failed, using FP32 CLIP: {e}")
+    
+    def _compile_clip(self):
+        """Compile the CLIP vision encoder with torch.compile and warm it up."""
+        if not hasattr(torch, "compile"):
+            return
+        
+        original_visual = self.clip_model.visual
+        try:
+            print("🔄 Compiling CLIP image encoder...")
+            mode = "reduce-overhead" if self.device == "cuda" else "default"
+            self.clip_model.visual = torch.compile(original_visual, mode=mode, fullgraph=False)
+            
+            # Warm up with the fixed batch shape so the compiled graph is cached before real work
+            resolution = original_visual.input_resolution
+            dummy = torch.zeros(self.embed_batch_size, 3, resolution, resolution,
+                                device=self.device, dtype=self.dtype)
+            with torch.inference_mode():
+                self.clip_model.encode_image(dummy)
+            
+            self.compiled = True
+            print("✅ CLIP image encoder compiled")
+            
+        except Exception as e:
+            print(f"⚠️  torch.compile unavailable, using eager CLIP: {e}")
+            self.clip_model.visual = original_visual
+            self.compiled = False
+    
+    def _init_gpu_preprocess(self):
+        """Build CLIP's resize/crop/normalize as torchvision v2 transforms that run on the GPU."""
+        if self.device != "cuda" or not GPU_PREPROCESS_AVAILABLE:
+            return
+        
+        resolution = self.clip_model.visual.input_resolution
+        # Same steps and constants as clip.load()'s CPU preprocess
+        self.gpu_resize = v2.Compose([
+            v2.Resize(resolution, interpolation=InterpolationMode.BICUBIC, antialias=True),
+            v2.CenterCrop(resolution)
+        ])
+        self.gpu_normalize = v2.Compose([
+            v2.ToDtype(torch.float32, scale=True),
+            v2.Normalize(mean=[0.48145466, 0.4578275, 0.40821073],
+                         std=[0.26862954, 0.26130258, 0.27577711])
+        ])
+        print("✅ CLIP preprocessing will run on the GPU")
+    
+    def _init_onnx_backend(self):
+        """Export the CLIP vision encoder to ONNX once and load it with onnxruntime."""
+        if not ONNX_AVAILABLE:
+            print("⚠️  onnxruntime not available, using PyTorch CLIP. Install with: pip install onnxruntime-gpu onnx")
+            return
+        
+        try:
+            self.onnx_session = load_clip_onnx_session(self.clip_model.visual, self.device, self.dtype)
+            print(f"✅ ONNX Runtime backend ready ({self.onnx_session.get_providers()[0]})")
+            
+        except Exception as e:
+            print(f"⚠️  ONNX backend initialization failed, using PyTorch CLIP: {e}")
+            self.onnx_session = None
+    
     def _init_pinecone(self):
         """Initialize Pinecone client and connect to the index."""
         if not PINECONE_AVAILABLE:
@@ -96,7 +310,7 @@ class CLIPImageVectorization:
                 print(f"📝 Creating new Pinecone index: {index_name}")
                 self.pinecone_client.create_index(
                     name=index_name,
-                    dimension=512,  # CLIP ViT-B/32 dimension
+                    dimension=self.EMBEDDING_DIM,
                     metric="cosine",
                     spec={"serverless": {"cloud": "aws", "region": "us-east-1"}}
                 )
@@ -105,7 +319,7 @@ class CLIPImageVectorization:
                 print(f"✅ Using existing Pinecone index: {index_name}")
             
             # Connect to the index
-            self.index = self.pinecone_client.Index(index_name)
+            self.index = self.pinecone_client.Index(index_name, pool_threads=self.PINECONE_POOL_THREADS)
             print(f"✅ Pinecone client initialized successfully - Index: {index_name}")
             
         except Exception as e:
@@ -128,21 +342,15 @@ class CLIPImageVectorization:
             
             print(f"📁 Loading catalog data from: {self.catalog_path}")
             
-            # Use pandas with proper CSV parsing to handle quoted fields with commas
-            df = pd.read_csv(self.catalog_path, quotechar='"', skipinitialspace=True)
-            items = []
-            
-            for _, row in df.iterrows():
-                # Clean up any NaN values and convert to strings
-                items.append({
-                    'catalog_number': str(row['catalog_number']) if pd.notna(row['catalog_number']) else '',
-                    'item_name': str(row['item_name']) if pd.notna(row['item_name']) else '',
-                    'item_type': str(row['item_type']) if pd.notna(row['item_type']) else '',
-                    'price': str(row['price']) if pd.notna(row['price']) else '',
-                    'color': str(row['color']) if pd.notna(row['color']) else 'Standard finish',
-                    'image_url': str(row['image_url']) if pd.notna(row['image_url']) else '',
-                    'link': str(row['link']) if pd.notna(row['link']) else ''
-                })
+            # Use pandas with proper CSV parsing to handle quoted fields with commas;
+            # read only the needed columns, as strings, with the C parser
+            columns = ['catalog_number', 'item_name', 'item_type', 'price', 'color', 'image_url', 'link']
+            df = pd.read_csv(self.catalog_path, quotechar='"', skipinitialspace=True,
+                             engine='c', dtype=str, usecols=columns)
+            
+            # Clean up any NaN values in bulk rather than per row
+            df = df.fillna({'color': 'Standard finish'}).fillna('')
+            items = df[columns].to_dict('records')
             
             print(f"✅ Loaded {len(items)} items from catalog")
             return items
@@ -151,6 +359,34 @@ class CLIPImageVectorization:
             print(f"❌ Error loading catalog data: {e}")
             return []
     
+    def _build_category_index(self):
+        """Scan every known category folder once so image lookups never list directories per item."""
+        for category_folder in set(self.CATEGORY_FOLDERS.values()):
+            self._index_category(category_folder)
+    
+    def _index_category(self, category_folder: str) -> Optional[Dict[str, str]]:
+        """Return the cached {filename: path} index for a category folder, scanning it on first use."""
+        if category_folder in self._category_files:
+            return self._category_files[category_folder]
+        
+        category_dir = os.path.join(self.base_image_dir, category_folder)
+        if not os.path.isdir(category_dir):
+            self._category_files[category_folder] = None
+            return None
+        
+        files = {}
+        images = []
+        with os.scandir(category_dir) as entries:
+            for entry in entries:
+                files[entry.name] = entry.path
+                name_lower = entry.name.lower()
+                if name_lower.endswith(self.IMAGE_EXTENSIONS):
+                    images.append((entry.name, name_lower, entry.path))
+        
+        self._category_files[category_folder] = files
+        self._category_images[category_folder] = images
+        return files
+    
     def find_image_path(self, item: Dict) -> Optional[str]:
         """Find the actual image file path for an item."""
         try:
@@ -163,147 +399,330 @@ class CLIPImageVectorization:
                 return image_url
             
             # Try to find image in the appropriate category folder
-            category_folders = {
-                'sofa': 'sofas',
-                'sofas': 'sofas',
-                'chair': 'chairs',
-                'chairs': 'chairs',
-                'table': 'tables',
-                'tables': 'tables',
-                'bench': 'benches',
-                'benches': 'benches',
-                'nightstand': 'nightstands',
-                'nightstands': 'nightstands',
-                'lighting': 'lighting',
-                'lamp': 'lighting',
-                'rug': 'rugs',
-                'rugs': 'rugs'
-            }
+            category_folder = self.CATEGORY_FOLDERS.get(item_type.lower(), item_type.lower())
+            category_files = self._index_category(category_folder)
             
-            category_folder = category_folders.get(item_type.lower(), item_type.lower())
-            category_dir = os.path.join(self.base_image_dir, category_folder)
-            
-            if not os.path.exists(category_dir):
+            if category_files is None:
                 return None
             
             # First, try to match the exact filename from image_url (with different extensions)
             if image_url:
                 base_filename = os.path.splitext(os.path.basename(image_url))[0]
                 for ext in ['.png', '.jpg', '.jpeg']:
-                    potential_path = os.path.join(category_dir, base_filename + ext)
-                    if os.path.exists(potential_path):
+                    potential_path = category_files.get(base_filename + ext)
+                    if potential_path:
                         return potential_path
             
             # If that doesn't work, look for image files that might match this item
-            for filename in os.listdir(category_dir):
-                if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    # Check if filename contains catalog number or item name
-                    item_name_clean = item.get('item_name', '').replace(' ', '_').replace('·', '').replace(',', '').replace('(', '').replace(')', '')
-                    if (catalog_number in filename or 
-                        item_name_clean.lower() in filename.lower() or
-                        item_type.lower() in filename.lower()):
-                        return os.path.join(category_dir, filename)
+            item_name_clean = item.get('item_name', '').translate(self.ITEM_NAME_TRANSLATION).lower()
+            item_type_lower = item_type.lower()
+            for filename, filename_lower, path in self._category_images[category_folder]:
+                # Check if filename contains catalog number or item name
+                if (catalog_number in filename or 
+                    item_name_clean in filename_lower or
+                    item_type_lower in filename_lower):
+                    return path
             
             return None
             
         except Exception as e:
-            print(f"❌ Error finding image path for {item.get('catalog_number', 'unknown')}: {e}")
+            logger.warning(f"❌ Error finding image path for {item.get('catalog_number', 'unknown')}: {e}")
             return None
     
-    def get_clip_embedding(self, image_path: str) -> Optional[List[float]]:
-        """Get CLIP embedding for an image."""
+    def _image_hash(self, image_path: str) -> Optional[str]:
+        """Return the SHA-1 of an image file's contents, or None if it cannot be read."""
         try:
-            if not self.clip_model:
-                print("❌ CLIP model not available")
-                return None
-            
-            print(f"    🔍 CLIP embedding image: {os.path.basename(image_path)}")
-            
-            # Load and preprocess image
-            image = Image.open(image_path).convert('RGB')
-            image_input = self.clip_preprocess(image).unsqueeze(0).to(self.device)
+            with open(image_path, 'rb') as f:
+                return hashlib.sha1(f.read()).hexdigest()
+        except OSError:
+            return None
+    
+    def _load_cached_embedding(self, image_hash: Optional[str]) -> Optional[np.ndarray]:
+        """Load a cached embedding for an image hash, or None on a miss."""
+        if not image_hash:
+            return None
+        
+        cache_path = os.path.join(self.embedding_cache_dir, image_hash + '.npy')
+        if not os.path.exists(cache_path):
+            return None
+        
+        try:
+            return np.load(cache_path)
+        except Exception:
+            return None
+    
+    def _save_cached_embedding(self, image_hash: Optional[str], embedding: np.ndarray):
+        """Persist an embedding under its image hash."""
+        if not image_hash:
+            return
+        
+        try:
+            np.save(os.path.join(self.embedding_cache_dir, image_hash + '.npy'), embedding)
+        except Exception as e:
+            logger.warning(f"⚠️  Could not cache embedding {image_hash}: {e}")
+    
+    def iter_clip_embeddings(self, image_paths: List[str], batch_size: Optional[int] = None,
+                             num_workers: Optional[int] = None):
+        """Yield (positions, embeddings) per encoded batch as a float32 [B, 512] array; positions index into image_paths."""
+        if not self.clip_model:
+            print("❌ CLIP model not available")
+            return
+        
+        if not image_paths:
+            return
+        
+        if batch_size is None:
+            batch_size = self.embed_batch_size
+        elif self.compiled and batch_size > self.embed_batch_size:
+            # Larger batches can't be padded to the warmed-up shape and would trigger a recompile
+            print(f"⚠️  Capping embed batch size at {self.embed_batch_size} for the compiled CLIP encoder")
+            batch_size = self.embed_batch_size
+        
+        if num_workers is None:
+            num_workers = max(1, (os.cpu_count() or 2) // 2)
+        
+        # Serve unchanged images from the on-disk cache and only encode new or changed ones
+        image_hashes: List[Optional[str]] = [None] * len(image_paths)
+        encode_positions = list(range(len(image_paths)))
+        if self.use_cache:
+            os.makedirs(self.embedding_cache_dir, exist_ok=True)
+            cached_positions = []
+            cached_embeddings = []
+            encode_positions = []
+            for position, image_path in enumerate(image_paths):
+                image_hashes[position] = self._image_hash(image_path)
+                cached = self._load_cached_embedding(image_hashes[position])
+                if cached is not None:
+                    cached_positions.append(position)
+                    cached_embeddings.append(cached)
+                else:
+                    encode_positions.append(position)
+            
+            if cached_positions:
+                logger.info(f"♻️  Loaded {len(cached_positions)} CLIP embeddings from cache")
+                yield cached_positions, np.stack(cached_embeddings)
+        
+        if not encode_positions:
+            return
+        
+        encode_paths = [image_paths[position] for position in encode_positions]
+        
+        # Decode (and, without GPU preprocessing, transform) in worker processes so the GPU is not left waiting on PIL
+        gpu_preprocess = self.gpu_resize is not None and self.onnx_session is None
+        dataset = CatalogImageDataset(encode_paths, self.clip_preprocess, self.clip_model.visual.input_resolution,
+                                      raw=gpu_preprocess)
+        loader = DataLoader(
+            dataset,
+            batch_size=batch_size,
+            num_workers=num_workers,
+            pin_memory=(self.device == "cuda"),
+            collate_fn=collate_raw_images if gpu_preprocess else None
+        )
+        
+        for image_input, indices, loaded in loader:
+            for idx in indices[~loaded].tolist():
+                logger.warning(f"❌ Error loading image {encode_paths[idx]}")
             
-            # Get image features
-            with torch.no_grad():
-                image_features = self.clip_model.encode_image(image_input)
-                # Normalize features
-                image_features = image_features / image_features.norm(dim=-1, keepdim=True)
-                # Convert to list
-                embedding = image_features.cpu().numpy().flatten().tolist()
+            if not loaded.any():
+                continue
             
-            print(f"    ✅ Generated CLIP embedding (dim: {len(embedding)})")
-            return embedding
+            positions = [encode_positions[idx] for idx in indices[loaded].tolist()]
             
-        except Exception as e:
-            print(f"❌ Error getting CLIP embedding for {image_path}: {e}")
-            return None
+            try:
+                logger.debug(f"🔍 CLIP embedding {len(positions)} images")
+                
+                if self.onnx_session is not None:
+                    # ONNX Runtime consumes host arrays directly; the providers handle device transfer
+                    onnx_input = image_input[loaded].numpy().astype(np.float16 if self.dtype == torch.float16 else np.float32)
+                    image_features = self.onnx_session.run(None, {'pixel_values': onnx_input})[0]
+                else:
+                    if gpu_preprocess:
+                        # Resize/crop each decoded image on the GPU, then normalize the stacked batch at once
+                        image_input = torch.stack([
+                            self.gpu_resize(image.to(self.device, non_blocking=True))
+                            for image, ok in zip(image_input, loaded.tolist()) if ok
+                        ])
+                        image_input = self.gpu_normalize(image_input).to(self.dtype)
+                    else:
+                        image_input = image_input[loaded].to(self.device, dtype=self.dtype, non_blocking=True)
+                    
+                    # Pad short batches so the compiled encoder always sees the warmed-up shape
+                    if self.compiled and image_input.shape[0] < self.embed_batch_size:
+                        padding = image_input.new_zeros((self.embed_batch_size - image_input.shape[0],) + image_input.shape[1:])
+                        image_input = torch.cat([image_input, padding])
+                    
+                    # Get image features for the whole batch in one forward pass
+                    with torch.inference_mode():
+                        image_features = self.clip_model.encode_image(image_input)[:len(positions)].cpu().numpy()
+                
+                # Back to FP32 before normalizing to avoid FP16 underflow, then L2-normalize the whole batch
+                batch_embeddings = image_features.astype(np.float32)
+                batch_embeddings /= np.linalg.norm(batch_embeddings, axis=1, keepdims=True)
+                
+                logger.debug(f"✅ Generated {len(positions)} CLIP embeddings (dim: {batch_embeddings.shape[1]})")
+                
+                if self.use_cache:
+                    for position, embedding in zip(positions, batch_embeddings):
+                        self._save_cached_embedding(image_hashes[position], embedding)
+                
+                yield positions, batch_embeddings
+                
+            except Exception as e:
+                logger.error(f"❌ Error getting CLIP embeddings for batch starting at {positions[0]}: {e}")
+    
+    def get_clip_embeddings(self, image_paths: List[str], batch_size: Optional[int] = None,
+                            num_workers: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Get CLIP embeddings for a list of images, encoding them in batches.
+
+        Returns a float32 [N, 512] array aligned with image_paths and a boolean mask
+        marking which rows were successfully embedded.
+        """
+        embeddings = np.zeros((len(image_paths), self.EMBEDDING_DIM), dtype=np.float32)
+        valid = np.zeros(len(image_paths), dtype=bool)
+        
+        for positions, batch_embeddings in self.iter_clip_embeddings(image_paths, batch_size, num_workers):
+            embeddings[positions] = batch_embeddings
+            valid[positions] = True
+        
+        return embeddings, valid
+    
+    def get_clip_embedding(self, image_path: str) -> Optional[List[float]]:
+        """Get CLIP embedding for a single image."""
+        embeddings, valid = self.get_clip_embeddings([image_path], num_workers=0)
+        return embeddings[0].tolist() if valid[0] else None
+    
+    def _build_vector(self, item: Dict, image_path: str, embedding: List[float]) -> Dict:
+        """Prepare a Pinecone vector record for an item."""
+        return {
+            'id': item['catalog_number'],
+            'values': embedding,
+            'metadata': {
+                'item_name': item['item_name'],
+                'item_type': item['item_type'],
+                'price': item['price'],
+                'color': item['color'],
+                'image_url': item['image_url'],
+                'link': item['link'],
+                'image_path': image_path
+            }
+        }
     
-    def upsert_to_pinecone(self, items: List[Dict], batch_size: int = 50):
-        """Upsert items to Pinecone database."""
+    def resolve_image_paths(self, items: List[Dict], max_workers: int = 16) -> List[Optional[str]]:
+        """Find image paths for all items up front, overlapping filesystem lookups in a thread pool."""
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.find_image_path, items))
+    
+    def upsert_to_pinecone(self, items: List[Dict], image_paths: Optional[List[Optional[str]]] = None,
+                           embed_batch_size: Optional[int] = None, upsert_batch_size: Optional[int] = None):
+        """Upsert items to Pinecone database.
+
+        image_paths, if given, holds the pre-resolved image path (or None) for each item.
+        """
         try:
             if not self.index:
                 print("❌ Pinecone index not available")
                 return False
             
+            # CLIP encode and Pinecone upsert have different optimal batch sizes
+            embed_batch_size = embed_batch_size or self.embed_batch_size
+            batch_size = upsert_batch_size or self.upsert_batch_size
+            
             print(f"📤 Upserting {len(items)} items to Pinecone in batches of {batch_size}")
             
             successful_upserts = 0
             failed_upserts = 0
             
-            for i in range(0, len(items), batch_size):
-                batch = items[i:i + batch_size]
-                vectors_to_upsert = []
-                
-                print(f"🔄 Processing batch {i//batch_size + 1}/{(len(items) + batch_size - 1)//batch_size}")
+            if image_paths is None:
+                image_paths = self.resolve_image_paths(items)
+            
+            # Keep only items with an image so a single DataLoader pass can encode the whole catalog
+            ready_items = []
+            ready_paths = []
+            for item, image_path in zip(items, image_paths):
+                if not image_path:
+                    logger.debug(f"⚠️  No image found for {item['catalog_number']}")
+                    failed_upserts += 1
+                    continue
                 
-                for item in batch:
-                    try:
-                        # Find image path
-                        image_path = self.find_image_path(item)
-                        if not image_path:
-                            print(f"⚠️  No image found for {item['catalog_number']}")
-                            failed_upserts += 1
-                            continue
-                        
-                        # Get CLIP embedding
-                        embedding = self.get_clip_embedding(image_path)
-                        if not embedding:
-                            print(f"⚠️  Failed to get CLIP embedding for {item['catalog_number']}")
-                            failed_upserts += 1
-                            continue
-                        
-                        # Prepare vector for upsert
-                        vector_data = {
-                            'id': item['catalog_number'],
-                            'values': embedding,
-                            'metadata': {
-                                'item_name': item['item_name'],
-                                'item_type': item['item_type'],
-                                'price': item['price'],
-                                'color': item['color'],
-                                'image_url': item['image_url'],
-                                'link': item['link'],
-                                'image_path': image_path
-                            }
-                        }
-                        
-                        vectors_to_upsert.append(vector_data)
-                        successful_upserts += 1
+                ready_items.append(item)
+                ready_paths.append(image_path)
+            
+            # Items that share an image (e.g. color variants) share one embedding, so encode each path once
+            path_to_positions: Dict[str, List[int]] = defaultdict(list)
+            for position, image_path in enumerate(ready_paths):
+                path_to_positions[image_path].append(position)
+            unique_paths = list(path_to_positions)
+            
+            if len(unique_paths) < len(ready_paths):
+                print(f"♻️  {len(ready_paths) - len(unique_paths)} items share images; encoding {len(unique_paths)} unique images")
+            
+            # Encode on a producer thread while this thread sends finished batches to Pinecone,
+            # so GPU work and network I/O overlap
+            embed_queue = queue.Queue(maxsize=4)
+            embedded_positions = set()
+            
+            def produce_vectors():
+                try:
+                    vectors = []
+                    for path_indices, batch_embeddings in self.iter_clip_embeddings(unique_paths, embed_batch_size):
+                        # Convert to Python lists once per batch, only at the Pinecone boundary
+                        for path_index, embedding in zip(path_indices, batch_embeddings.tolist()):
+                            image_path = unique_paths[path_index]
+                            
+                            # Fan the embedding out to every item using this image
+                            for position in path_to_positions[image_path]:
+                                vectors.append(self._build_vector(ready_items[position], image_path, embedding))
+                                embedded_positions.add(position)
+                                
+                                if len(vectors) >= batch_size:
+                                    embed_queue.put(vectors)
+                                    vectors = []
+                    
+                    if vectors:
+                        embed_queue.put(vectors)
                         
-                    except Exception as e:
-                        print(f"❌ Error processing {item['catalog_number']}: {e}")
-                        failed_upserts += 1
-                        continue
+                except Exception as e:
+                    logger.error(f"❌ Error generating CLIP embeddings: {e}")
+                finally:
+                    embed_queue.put(None)
+            
+            producer = threading.Thread(target=produce_vectors, daemon=True)
+            producer.start()
+            
+            pending_upserts = []
+            while True:
+                vectors_to_upsert = embed_queue.get()
+                if vectors_to_upsert is None:
+                    break
                 
-                # Upsert batch to Pinecone
-                if vectors_to_upsert:
-                    try:
-                        self.index.upsert(vectors=vectors_to_upsert)
-                        print(f"✅ Upserted {len(vectors_to_upsert)} vectors to Pinecone")
-                    except Exception as e:
-                        print(f"❌ Error upserting batch to Pinecone: {e}")
-                        failed_upserts += len(vectors_to_upsert)
-                        successful_upserts -= len(vectors_to_upsert)
+                successful_upserts += len(vectors_to_upsert)
+                logger.info(f"🔄 Embedded {successful_upserts}/{len(ready_items)} items")
+                
+                # Send batch to Pinecone without waiting, so batches upload in parallel
+                try:
+                    pending_upserts.append((self.index.upsert(vectors=vectors_to_upsert, async_req=True),
+                                            len(vectors_to_upsert)))
+                except Exception as e:
+                    logger.error(f"❌ Error upserting batch to Pinecone: {e}")
+                    failed_upserts += len(vectors_to_upsert)
+                    successful_upserts -= len(vectors_to_upsert)
+            
+            producer.join()
+            
+            for position, item in enumerate(ready_items):
+                if position not in embedded_positions:
+                    logger.debug(f"⚠️  Failed to get CLIP embedding for {item['catalog_number']}")
+                    failed_upserts += 1
+            
+            # Wait for all in-flight upserts
+            for async_result, count in pending_upserts:
+                try:
+                    async_result.get()
+                    logger.debug(f"✅ Upserted {count} vectors to Pinecone")
+                except Exception as e:
+                    logger.error(f"❌ Error upserting batch to Pinecone: {e}")
+                    failed_upserts += count
+                    successful_upserts -= count
             
             print(f"\n📊 Upsert Summary:")
             print(f"   ✅ Successful: {successful_upserts}")
@@ -334,8 +753,13 @@ class CLIPImageVectorization:
             print("❌ No catalog data loaded")
             return False
         
+        # Resolve image paths before encoding so filesystem latency never stalls the GPU
+        print(f"🔍 Resolving image paths for {len(items)} items")
+        image_paths = self.resolve_image_paths(items)
+        print(f"✅ Found images for {sum(1 for path in image_paths if path)}/{len(items)} items")
+        
         # Process images and upsert to Pinecone
-        success = self.upsert_to_pinecone(items)
+        success = self.upsert_to_pinecone(items, image_paths)
         
         if success:
             print(f"\n🎉 SUCCESS!")
@@ -351,6 +775,22 @@ class CLIPImageVectorization:
 
 def main():
     """Main function to run CLIP image vectorization."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Vectorize Interior Define Catalog 2 images with CLIP and store them in Pinecone')
+    parser.add_argument('--embed-batch-size', type=int, default=32, help='Images per CLIP forward pass (default: 32)')
+    parser.add_argument('--upsert-batch-size', type=int, default=100, help='Vectors per Pinecone upsert request (default: 100)')
+    parser.add_argument('--backend', choices=['torch', 'onnx'], default='torch',
+                       help='Image encoder runtime: PyTorch or ONNX Runtime with TensorRT/CUDA (default: torch)')
+    parser.add_argument('--no-cache', action='store_true', help='Re-encode every image instead of reusing cached embeddings')
+    parser.add_argument('--quantize', action='store_true', help='Use an int8-quantized image encoder on CPU-only hosts')
+    
+    parser.add_argument('--verbose', action='store_true', help='Log per-item and per-batch progress')
+    
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format='%(message)s')
+    
     print("🖼️  Interior Define Catalog 2 CLIP Image Vectorization")
     print("=" * 60)
     
@@ -364,7 +804,12 @@ def main():
         return
     
     try:
-        vectorizer = CLIPImageVectorization(config=config)
+        vectorizer = CLIPImageVectorization(config=config,
+                                            embed_batch_size=args.embed_batch_size,
+                                            upsert_batch_size=args.upsert_batch_size,
+                                            backend=args.backend,
+                                            use_cache=not args.no_cache,
+                                            quantize=args.quantize)
         vectorizer.process_catalog_images()
         
     except KeyboardInterrupt:
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+ONNX Runtime backend for the CLIP ViT-B/32 image encoder
+Shared by clip_image_vectorization.py and furniture_similarity_search.py, which reuse the same exported model
+"""
+
+import os
+
+try:
+    import onnxruntime as ort
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+# Exported ONNX vision encoders and the TensorRT engine cache
+ONNX_CACHE_DIR = os.path.join(".cache", "onnx")
+
+def export_clip_onnx(visual, device: str, dtype) -> str:
+    """Export a CLIP vision encoder to ONNX (once per precision) and return the model path."""
+    import torch
+
+    os.makedirs(ONNX_CACHE_DIR, exist_ok=True)
+    precision = "fp16" if dtype == torch.float16 else "fp32"
+    onnx_path = os.path.join(ONNX_CACHE_DIR, f"clip_vit_b32_visual_{precision}.onnx")
+    if os.path.exists(onnx_path):
+        return onnx_path
+
+    print(f"🔄 Exporting CLIP image encoder to ONNX: {onnx_path}")
+    resolution = visual.input_resolution
+    dummy = torch.randn(1, 3, resolution, resolution, device=device, dtype=dtype)
+    # Export to a temp file and rename, so another process never loads a half-written model
+    temp_path = f"{onnx_path}.{os.getpid()}.tmp"
+    torch.onnx.export(
+        visual,
+        dummy,
+        temp_path,
+        opset_version=14,
+        input_names=['pixel_values'],
+        output_names=['image_embeds'],
+        dynamic_axes={'pixel_values': {0: 'batch'}, 'image_embeds': {0: 'batch'}}
+    )
+
+    # TensorRT needs fully inferred shapes for the dynamic batch axis
+    try:
+        import onnx
+        from onnxruntime.tools.symbolic_shape_infer import SymbolicShapeInference
+        inferred = SymbolicShapeInference.infer_shapes(onnx.load(temp_path), auto_merge=True)
+        onnx.save(inferred, temp_path)
+    except Exception as e:
+        print(f"⚠️  Symbolic shape inference skipped: {e}")
+
+    os.replace(temp_path, onnx_path)
+    return onnx_path
+
+def load_clip_onnx_session(visual, device: str, dtype) -> "ort.InferenceSession":
+    """Export (if needed) and load a CLIP vision encoder with the fastest available onnxruntime provider."""
+    onnx_path = export_clip_onnx(visual, device, dtype)
+
+    available_providers = ort.get_available_providers()
+    providers = []
+    if 'TensorrtExecutionProvider' in available_providers:
+        providers.append(('TensorrtExecutionProvider', {
+            'trt_fp16_enable': onnx_path.endswith("_fp16.onnx"),
+            'trt_engine_cache_enable': True,
+            'trt_engine_cache_path': ONNX_CACHE_DIR
+        }))
+    if 'CUDAExecutionProvider' in available_providers:
+        providers.append('CUDAExecutionProvider')
+    providers.append('CPUExecutionProvider')
+
+    return ort.InferenceSession(onnx_path, providers=providers)
@@ -6,20 +6,162 @@ Analyzes similarity results and finds budget-constrained combinations ranked by
 
 import os
 import csv
+import heapq
+import math
+import pickle
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
+from functools import reduce
+import numpy as np
 import pandas as pd
-import itertools
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, NamedTuple
 from config import Config
 
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Currency markers and separators stripped from a budget string; anything else (ranges, "5k", ...)
+# is left in so float() rejects it
+_BUDGET_RE = re.compile(r'[$,\s]|USD')
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, parallel=True)
+    def _score_combinations(prices, sims, budget, out_prices, out_sims):
+        """Score every combination of a (types x options) grid in parallel.
+
+        Combination index i selects, per type, the digits of i in base num_options (last type
+        varies fastest, matching np.unravel_index). Infeasible combinations get -inf similarity.
+        """
+        num_types, num_options = prices.shape
+        for index in prange(out_sims.shape[0]):
+            remainder = np.int64(index)
+            total_price = 0.0
+            total_sim = 0.0
+            for t in range(num_types - 1, -1, -1):
+                k = remainder % num_options
+                remainder //= num_options
+                total_price += prices[t, k]
+                total_sim += sims[t, k]
+            out_prices[index] = total_price
+            if total_price <= budget and total_price > 0:
+                out_sims[index] = total_sim
+            else:
+                out_sims[index] = -np.inf
+
+class CombinationItem(NamedTuple):
+    """One furniture item chosen for a combination."""
+    furniture_type: str
+    catalog_number: str
+    similarity_score: float
+    rank: int
+    price: float
+
+def _knapsack_bounds(sims: List[List[float]], prices: List[List[float]], budget: float,
+                     max_cells: int) -> Optional[List[List[float]]]:
+    """Budget-aware similarity bounds for branch-and-bound, from a multiple-choice knapsack DP.
+
+    bounds[t][d] is the best total similarity of one option from each of types t..end whose
+    prices, each rounded down to whole dollars, sum to at most d dollars (-inf if none do).
+    Rounding prices down never excludes a combination that fits, so this is a valid upper bound
+    that also accounts for the budget. Returns None for negative prices or a table over max_cells.
+    """
+    num_types = len(sims)
+    budget_dollars = int(math.floor(budget + 1e-6))
+    if budget_dollars < 0 or num_types * (budget_dollars + 1) > max_cells:
+        return None
+    if any(price < 0 for type_prices in prices for price in type_prices):
+        return None
+    
+    bounds = [np.zeros(budget_dollars + 1)]
+    for t in range(num_types - 1, -1, -1):
+        following = bounds[0]
+        table = np.full(budget_dollars + 1, -np.inf)
+        for similarity, price in zip(sims[t], prices[t]):
+            cost = int(math.floor(price))
+            if cost <= budget_dollars:
+                np.maximum(table[cost:], following[:budget_dollars + 1 - cost] + similarity, out=table[cost:])
+        bounds.insert(0, table)
+    return [table.tolist() for table in bounds]
+
+def _search_subspace(first_option: Optional[int], sims: List[List[float]], prices: List[List[float]],
+                     budget: float, top_k: int,
+                     bounds: Optional[List[List[float]]] = None) -> List[Tuple[float, float, Tuple[int, ...]]]:
+    """Depth-first search for the top_k combinations within budget, pruning hopeless branches.
+
+    A partial selection is abandoned as soon as even the cheapest remaining items would exceed
+    the budget, or even the most similar remaining items could not beat the current k-th best
+    combination. With bounds from _knapsack_bounds, the second test only counts remaining items
+    that fit the remaining budget. With first_option set, only combinations using that option of
+    the first type are searched. Module-level so it can run in a worker process; results are unordered.
+    """
+    num_types = len(sims)
+    
+    # Cheapest possible price and best possible similarity for types t..end (index num_types is 0)
+    min_prices = np.array([min(type_prices) for type_prices in prices] + [0.0])
+    max_sims = np.array([max(type_sims) for type_sims in sims] + [0.0])
+    min_price_suffix = np.cumsum(min_prices[::-1])[::-1].tolist()
+    max_sim_suffix = np.cumsum(max_sims[::-1])[::-1].tolist()
+    
+    best = []  # min-heap of (total_similarity, total_price, chosen option indices)
+    chosen = []
+    
+    def search(t: int, price: float, similarity: float):
+        # Prune: cheapest completion is over budget
+        if price + min_price_suffix[t] > budget:
+            return
+        # Prune: best completion within the remaining budget cannot beat the current k-th best
+        if bounds is not None:
+            completion = bounds[t][int(math.floor(budget - price + 1e-6))]
+            if completion == -math.inf:
+                return
+        else:
+            completion = max_sim_suffix[t]
+        if len(best) == top_k and similarity + completion <= best[0][0]:
+            return
+        
+        if t == num_types:
+            if price > 0:
+                entry = (similarity, price, tuple(chosen))
+                if len(best) < top_k:
+                    heapq.heappush(best, entry)
+                else:
+                    heapq.heappushpop(best, entry)
+            return
+        
+        for k in range(len(sims[t])):
+            chosen.append(k)
+            search(t + 1, price + prices[t][k], similarity + sims[t][k])
+            chosen.pop()
+    
+    if first_option is None:
+        search(0, 0.0, 0.0)
+    else:
+        chosen.append(first_option)
+        search(1, prices[0][first_option], sims[0][first_option])
+    return best
+
 class FurnitureCombinationOptimizer:
     """Furniture combination optimizer for budget-constrained selections"""
     
+    # Above this many combinations, enumerating them all in NumPy costs too much memory;
+    # branch-and-bound is used instead
+    MAX_VECTORIZED_COMBINATIONS = 2_000_000
+    
+    # Largest (furniture types x budget in dollars) table the knapsack bounds may allocate
+    MAX_KNAPSACK_CELLS = 5_000_000
+    
     def __init__(self):
         """Initialize the optimizer."""
         self.master_log_path = "querries/master_querry_log.csv"
         self.similarity_results = {}
         self.budget = 0
         self.query_number = None
+        # Master log as read by check_master_query_log, reused when writing the status back
+        self._master_df = None
         
     def check_master_query_log(self) -> Optional[int]:
         """Check master query log for queries that need combination optimization."""
@@ -32,6 +174,7 @@ class FurnitureCombinationOptimizer:
             
             # Read the CSV file
             df = pd.read_csv(self.master_log_path)
+            self._master_df = df
             
             if df.empty:
                 print("ℹ️ No queries found in master log")
@@ -67,9 +210,8 @@ class FurnitureCombinationOptimizer:
     def parse_budget(self, budget_str: str) -> float:
         """Parse budget string to float value."""
         try:
-            # Remove currency symbols and convert to float
-            budget_clean = budget_str.replace('$', '').replace(',', '').strip()
-            return float(budget_clean)
+            # Remove currency symbols and separators in one pass and convert to float
+            return float(_BUDGET_RE.sub('', budget_str))
         except Exception as e:
             print(f"❌ Error parsing budget '{budget_str}': {e}")
             return 0.0
@@ -85,33 +227,38 @@ class FurnitureCombinationOptimizer:
             
             print(f"📁 Loading similarity results: {similarity_csv_path}")
             
-            # Read the CSV file
-            df = pd.read_csv(similarity_csv_path)
+            # Single pass over the CSV keeping the top 3 results for each furniture type
+            top_results: Dict[str, List[Tuple[float, int, str]]] = {}
+            with open(similarity_csv_path, newline='', encoding='utf-8') as csvfile:
+                for row in csv.DictReader(csvfile):
+                    furniture_type = row['image_name'].replace('_extracted_grayscale.png', '')
+                    rank = int(row['rank'])
+                    entry = (float(row['similarity_score']), -rank, row['catalog_number'])
+                    
+                    # Min-heap of size 3: the weakest kept result (ties: the worse rank) is at the root
+                    heap = top_results.setdefault(furniture_type, [])
+                    if len(heap) < 3:
+                        heapq.heappush(heap, entry)
+                    else:
+                        heapq.heappushpop(heap, entry)
             
-            if df.empty:
+            if not top_results:
                 print("❌ No similarity results found")
                 return False
             
-            # Group by image_name and store top results for each furniture type
+            # One set of parallel arrays per furniture type, most similar first
             self.similarity_results = {}
-            
-            for image_name in df['image_name'].unique():
-                furniture_type = image_name.replace('_extracted_grayscale.png', '')
-                
-                # Get top 3 results for each furniture type
-                furniture_results = df[df['image_name'] == image_name].head(3)
-                
-                self.similarity_results[furniture_type] = []
-                for _, row in furniture_results.iterrows():
-                    self.similarity_results[furniture_type].append({
-                        'catalog_number': row['catalog_number'],
-                        'similarity_score': row['similarity_score'],
-                        'rank': row['rank']
-                    })
+            for furniture_type, heap in top_results.items():
+                entries = sorted(heap, reverse=True)
+                self.similarity_results[furniture_type] = {
+                    'catalog': np.array([entry[2] for entry in entries], dtype=object),
+                    'score': np.array([entry[0] for entry in entries], dtype=np.float64),
+                    'rank': np.array([-entry[1] for entry in entries], dtype=np.int32)
+                }
             
             print(f"✅ Loaded similarity results for {len(self.similarity_results)} furniture types")
             for furniture_type, results in self.similarity_results.items():
-                print(f"   • {furniture_type}: {len(results)} options")
+                print(f"   • {furniture_type}: {len(results['catalog'])} options")
             
             return True
             
@@ -130,36 +277,32 @@ class FurnitureCombinationOptimizer:
             
             print(f"📁 Loading furniture prices from: {catalog_path}")
             
-            # Read the catalog
-            df = pd.read_csv(catalog_path)
-            
-            # Create price lookup dictionary
-            price_lookup = {}
-            
-            for _, row in df.iterrows():
-                catalog_number = row['catalog_number']
-                price_str = str(row.get('price', '0'))
-                
-                # Parse price (handle various formats)
+            price_lookup = self._load_cached_prices(catalog_path)
+            if price_lookup is None:
+                # Read only the two columns used, with the multithreaded PyArrow parser when installed
+                columns = ['catalog_number', 'price']
                 try:
-                    price_clean = price_str.replace('$', '').replace(',', '').replace('USD', '').strip()
-                    if price_clean and price_clean != 'nan':
-                        price = float(price_clean)
-                        price_lookup[catalog_number] = price
-                except:
-                    continue
+                    df = pd.read_csv(catalog_path, usecols=columns, dtype=str, engine='pyarrow')
+                except ImportError:
+                    df = pd.read_csv(catalog_path, usecols=columns, dtype=str)
+                
+                # Parse prices (handle various formats) for the whole column at once;
+                # anything that is not a number is dropped
+                price_clean = df['price'].astype(str).str.replace(r'[\$,]|USD', '', regex=True).str.strip()
+                prices = pd.to_numeric(price_clean, errors='coerce')
+                valid = prices.notna()
+                
+                # Create price lookup dictionary
+                price_lookup = dict(zip(df.loc[valid, 'catalog_number'], prices[valid].astype(float)))
+                self._save_cached_prices(catalog_path, price_lookup)
             
             print(f"✅ Loaded prices for {len(price_lookup)} items")
             
             # Check if similarity results catalog numbers match master catalog
-            matched_items = 0
-            total_items = 0
-            
-            for furniture_type, items in self.similarity_results.items():
-                for item in items:
-                    total_items += 1
-                    if item['catalog_number'] in price_lookup:
-                        matched_items += 1
+            all_catalog_numbers = [catalog_number for results in self.similarity_results.values()
+                                   for catalog_number in results['catalog'].tolist()]
+            total_items = len(all_catalog_numbers)
+            matched_items = sum(1 for catalog_number in all_catalog_numbers if catalog_number in price_lookup)
             
             if matched_items == 0:
                 print(f"⚠️  No catalog numbers match between similarity results and master catalog")
@@ -172,10 +315,9 @@ class FurnitureCombinationOptimizer:
             
             # Print sample prices
             print(f"📊 Sample prices:")
-            for furniture_type, items in self.similarity_results.items():
-                if items:
-                    sample_item = items[0]
-                    sample_price = price_lookup.get(sample_item['catalog_number'], 0)
+            for furniture_type, results in self.similarity_results.items():
+                if len(results['catalog']):
+                    sample_price = price_lookup.get(results['catalog'][0], 0)
                     if sample_price == 0:
                         # Use estimated price for unmatched items
                         estimated_price = self._get_estimated_price_for_type(furniture_type, 0)
@@ -189,13 +331,40 @@ class FurnitureCombinationOptimizer:
             print(f"❌ Error loading furniture prices: {e}")
             return self._get_estimated_prices()
     
+    @staticmethod
+    def _price_cache_path(catalog_path: str) -> str:
+        """Path of the pickled price lookup kept next to the catalog CSV."""
+        return catalog_path + '.prices.pkl'
+    
+    def _load_cached_prices(self, catalog_path: str) -> Optional[Dict[str, float]]:
+        """Load the cached price lookup if it is at least as new as the catalog CSV."""
+        cache_path = self._price_cache_path(catalog_path)
+        try:
+            if not os.path.exists(cache_path) or os.path.getmtime(cache_path) < os.path.getmtime(catalog_path):
+                return None
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"⚠️  Ignoring unreadable price cache {cache_path}: {e}")
+            return None
+    
+    def _save_cached_prices(self, catalog_path: str, price_lookup: Dict[str, float]):
+        """Pickle the price lookup next to the catalog CSV so later runs skip parsing it."""
+        cache_path = self._price_cache_path(catalog_path)
+        try:
+            with open(cache_path, 'wb') as f:
+                pickle.dump(price_lookup, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            print(f"⚠️  Could not write price cache {cache_path}: {e}")
+    
     def _get_estimated_prices(self) -> Dict[str, float]:
         """Get estimated prices for all items in similarity results."""
         price_lookup = {}
         
-        for furniture_type, items in self.similarity_results.items():
-            for i, item in enumerate(items):
-                catalog_number = item['catalog_number']
+        for furniture_type, results in self.similarity_results.items():
+            catalog = results['catalog']
+            for i in range(len(catalog)):
+                catalog_number = catalog[i]
                 estimated_price = self._get_estimated_price_for_type(furniture_type, i)
                 price_lookup[catalog_number] = estimated_price
         
@@ -230,77 +399,137 @@ class FurnitureCombinationOptimizer:
         
         return round(estimated_price, 2)
     
-    def generate_combinations(self, price_lookup: Dict[str, float]) -> List[Dict]:
-        """Generate all possible combinations within budget."""
+    def generate_combinations(self, price_lookup: Dict[str, float], top_k: int = 100) -> List[Dict]:
+        """Find the top_k combinations within budget (one item per furniture type) by total similarity."""
         try:
-            print(f"🔍 Generating combinations within budget: ${self.budget:,.2f}")
-            
-            # Get furniture types
-            furniture_types = list(self.similarity_results.keys())
-            
-            # Generate all combinations
+            budget = self.budget
+            print(f"🔍 Generating combinations within budget: ${budget:,.2f}")
+            
+            # Get furniture types once; every per-type list below follows this order
+            furniture_types = tuple(self.similarity_results.keys())
+            
+            # Per furniture type: similarity and price arrays, aligned with its catalog array.
+            # Each catalog number is resolved against price_lookup exactly once here; the searches
+            # below only index these arrays by position
+            type_sims = []
+            type_prices = []
+            for furniture_type in furniture_types:
+                results = self.similarity_results[furniture_type]
+                catalog = results['catalog']
+                type_sims.append(results['score'])
+                type_prices.append(np.fromiter((price_lookup.get(catalog_number, 0) for catalog_number in catalog),
+                                               dtype=np.float64, count=len(catalog)))
+            
+            if any(len(sims) == 0 for sims in type_sims):
+                print("❌ Some furniture types have no options")
+                return []
+            
+            if top_k <= 0:
+                best = []
+            elif math.prod(len(sims) for sims in type_sims) <= self.MAX_VECTORIZED_COMBINATIONS:
+                best = self._top_combinations_vectorized(type_sims, type_prices, top_k)
+            else:
+                best = self._top_combinations_branch_and_bound(type_sims, type_prices, top_k)
+            
+            # Materialize details only for the surviving combinations, best first. The per-type
+            # columns are converted to plain lists once so each item is a few list indexings
+            item_columns = [
+                (self.similarity_results[furniture_type]['catalog'].tolist(), type_sims[t].tolist(),
+                 self.similarity_results[furniture_type]['rank'].tolist(), type_prices[t].tolist())
+                for t, furniture_type in enumerate(furniture_types)
+            ]
             combinations = []
-            
-            # Create list of all possible items with their details
-            all_items = []
-            for furniture_type, items in self.similarity_results.items():
-                for item in items:
-                    catalog_number = item['catalog_number']
-                    price = price_lookup.get(catalog_number, 0)
-                    
-                    all_items.append({
-                        'furniture_type': furniture_type,
-                        'catalog_number': catalog_number,
-                        'similarity_score': item['similarity_score'],
-                        'rank': item['rank'],
-                        'price': price
-                    })
-            
-            # Generate combinations (one item per furniture type)
-            furniture_types = list(self.similarity_results.keys())
-            
-            # Create combinations using itertools.product
-            for combination in itertools.product(*[self.similarity_results[ft] for ft in furniture_types]):
-                total_price = 0
-                total_similarity = 0
+            for total_similarity, total_price, selection in best:
                 combination_details = []
+                for t, k in enumerate(selection):
+                    catalogs, sims, ranks, prices = item_columns[t]
+                    combination_details.append(CombinationItem(furniture_types[t], catalogs[k], sims[k], ranks[k], prices[k]))
                 
-                for i, item in enumerate(combination):
-                    furniture_type = furniture_types[i]
-                    catalog_number = item['catalog_number']
-                    price = price_lookup.get(catalog_number, 0)
-                    similarity_score = item['similarity_score']
-                    
-                    total_price += price
-                    total_similarity += similarity_score
-                    
-                    combination_details.append({
-                        'furniture_type': furniture_type,
-                        'catalog_number': catalog_number,
-                        'similarity_score': similarity_score,
-                        'rank': item['rank'],
-                        'price': price
-                    })
-                
-                # Only include combinations within budget
-                if total_price <= self.budget and total_price > 0:
-                    combinations.append({
-                        'total_price': total_price,
-                        'total_similarity': total_similarity,
-                        'items': combination_details,
-                        'budget_remaining': self.budget - total_price
-                    })
-            
-            # Sort by total similarity score (descending)
-            combinations.sort(key=lambda x: x['total_similarity'], reverse=True)
-            
-            print(f"✅ Generated {len(combinations)} combinations within budget")
+                combinations.append({
+                    'total_price': total_price,
+                    'total_similarity': total_similarity,
+                    'items': combination_details,
+                    'budget_remaining': budget - total_price
+                })
+            
+            print(f"✅ Found top {len(combinations)} combinations within budget")
             return combinations
             
         except Exception as e:
             print(f"❌ Error generating combinations: {e}")
             return []
     
+    def _top_combinations_vectorized(self, type_sims: List[np.ndarray], type_prices: List[np.ndarray],
+                                     top_k: int) -> List[Tuple[float, float, Tuple[int, ...]]]:
+        """Score every combination at once with NumPy broadcasting and keep the top_k within budget.
+
+        Returns (total_similarity, total_price, option indices) tuples, best first.
+        """
+        if NUMBA_AVAILABLE:
+            # Rectangular grid; padded slots get an infinite price so they are never feasible
+            num_types = len(type_sims)
+            num_options = max(len(sims) for sims in type_sims)
+            prices = np.full((num_types, num_options), np.inf)
+            sims = np.zeros((num_types, num_options))
+            for t in range(num_types):
+                prices[t, :len(type_prices[t])] = type_prices[t]
+                sims[t, :len(type_sims[t])] = type_sims[t]
+            
+            shape = (num_options,) * num_types
+            total_prices = np.empty(math.prod(shape))
+            total_sims = np.empty(math.prod(shape))
+            _score_combinations(prices, sims, float(self.budget), total_prices, total_sims)
+            feasible = np.flatnonzero(total_sims > -np.inf)
+        else:
+            shape = tuple(len(sims) for sims in type_sims)
+            
+            # Outer sums over all types: one cell per combination
+            total_prices = reduce(np.add, np.ix_(*type_prices)).ravel()
+            total_sims = reduce(np.add, np.ix_(*type_sims)).ravel()
+            
+            feasible = np.flatnonzero((total_prices <= self.budget) & (total_prices > 0))
+        
+        if len(feasible) > top_k:
+            # Keep everything scoring at least the top_k-th best, so a tie at the cutoff is settled by index below
+            cutoff = -np.partition(-total_sims[feasible], top_k - 1)[top_k - 1]
+            feasible = feasible[total_sims[feasible] >= cutoff]
+        # Best first; equal scores keep enumeration (itertools.product) order, as the original sort did
+        feasible = feasible[np.lexsort((feasible, -total_sims[feasible]))][:top_k]
+        
+        selections = np.stack(np.unravel_index(feasible, shape), axis=1)
+        return [(float(total_sims[index]), float(total_prices[index]), tuple(selection.tolist()))
+                for index, selection in zip(feasible, selections)]
+    
+    def _top_combinations_branch_and_bound(self, type_sims: List[np.ndarray], type_prices: List[np.ndarray],
+                                           top_k: int) -> List[Tuple[float, float, Tuple[int, ...]]]:
+        """Branch-and-bound search for the top_k combinations within budget.
+
+        Each option of the first furniture type is searched in its own worker process and the
+        per-worker results are merged. Returns the same tuples as _top_combinations_vectorized.
+        """
+        # Plain Python floats: the search is scalar work, where NumPy scalars are slower
+        sims = [type_sims[t].tolist() for t in range(len(type_sims))]
+        prices = [type_prices[t].tolist() for t in range(len(type_prices))]
+        budget = float(self.budget)
+        bounds = _knapsack_bounds(sims, prices, budget, self.MAX_KNAPSACK_CELLS)
+        
+        num_first_options = len(sims[0])
+        max_workers = min(os.cpu_count() or 1, num_first_options)
+        if max_workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                    partial_results = list(executor.map(_search_subspace, range(num_first_options), repeat(sims),
+                                                        repeat(prices), repeat(budget), repeat(top_k),
+                                                        repeat(bounds)))
+                best = list(chain.from_iterable(partial_results))
+            except Exception as e:
+                print(f"⚠️  Parallel combination search failed, searching in one process: {e}")
+                best = _search_subspace(None, sims, prices, budget, top_k, bounds)
+        else:
+            best = _search_subspace(None, sims, prices, budget, top_k, bounds)
+        
+        return heapq.nlargest(top_k, best, key=lambda entry: entry[0])
+    
     def save_combinations_to_csv(self, combinations: List[Dict]) -> str:
         """Save combinations to CSV file."""
         try:
@@ -309,28 +538,29 @@ class FurnitureCombinationOptimizer:
             # Ensure directory exists
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
             
-            with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = [
-                    'combination_rank', 'total_price', 'total_similarity', 'budget_remaining',
-                    'furniture_type', 'catalog_number', 'similarity_score', 'item_rank', 'price'
-                ]
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                
-                writer.writeheader()
-                
-                for rank, combination in enumerate(combinations, 1):
-                    for item in combination['items']:
-                        writer.writerow({
-                            'combination_rank': rank,
-                            'total_price': combination['total_price'],
-                            'total_similarity': combination['total_similarity'],
-                            'budget_remaining': combination['budget_remaining'],
-                            'furniture_type': item['furniture_type'],
-                            'catalog_number': item['catalog_number'],
-                            'similarity_score': item['similarity_score'],
-                            'item_rank': item['rank'],
-                            'price': item['price']
-                        })
+            # Flatten to one column list per field; one row per item in each combination
+            rows_per_combination = [len(combination['items']) for combination in combinations]
+            
+            def per_combination(values):
+                return [value for value, count in zip(values, rows_per_combination) for _ in range(count)]
+            
+            def per_item(key):
+                return [getattr(item, key) for combination in combinations for item in combination['items']]
+            
+            columns = {
+                'combination_rank': per_combination(range(1, len(combinations) + 1)),
+                'total_price': per_combination(combination['total_price'] for combination in combinations),
+                'total_similarity': per_combination(combination['total_similarity'] for combination in combinations),
+                'budget_remaining': per_combination(combination['budget_remaining'] for combination in combinations),
+                'furniture_type': per_item('furniture_type'),
+                'catalog_number': per_item('catalog_number'),
+                'similarity_score': per_item('similarity_score'),
+                'item_rank': per_item('rank'),
+                'price': per_item('price')
+            }
+            
+            # CRLF row endings, as csv.DictWriter wrote them
+            pd.DataFrame(columns).to_csv(output_path, index=False, encoding='utf-8', lineterminator='\r\n')
             
             print(f"✅ Combinations saved to: {output_path}")
             return output_path
@@ -353,8 +583,8 @@ class FurnitureCombinationOptimizer:
                 print(f"   📋 Items:")
                 
                 for item in combination['items']:
-                    print(f"      • {item['furniture_type'].title()}: {item['catalog_number']} "
-                          f"(Score: {item['similarity_score']:.4f}, Price: ${item['price']:,.2f})")
+                    print(f"      • {item.furniture_type.title()}: {item.catalog_number} "
+                          f"(Score: {item.similarity_score:.4f}, Price: ${item.price:,.2f})")
                 
                 print("-" * 80)
                 
@@ -364,8 +594,8 @@ class FurnitureCombinationOptimizer:
     def update_selection_status(self, status: str = "yes"):
         """Update the selected_sufficed status in master query log."""
         try:
-            # Read the CSV
-            df = pd.read_csv(self.master_log_path)
+            # Reuse the log read by check_master_query_log when there is one
+            df = self._master_df if self._master_df is not None else pd.read_csv(self.master_log_path)
             
             # Update the selected_sufficed status for the specific query
             df.loc[df['request_number'] == self.query_number, 'selected_sufficed'] = status
@@ -420,7 +650,7 @@ def main():
     optimizer.update_selection_status("yes")
     
     print(f"\n✅ SUCCESS!")
-    print(f"📊 Generated {len(combinations)} combinations within budget")
+    print(f"📊 Kept the top {len(combinations)} combinations within budget")
     print(f"📁 Results saved to: {csv_path}")
     print(f"✅ Selection status updated to 'yes' for query {query_number}")
     
@@ -6,15 +6,24 @@ Checks master query log for successful queries and performs Pinecone similarity
 
 import os
 import csv
-import base64
-import pandas as pd
+import hashlib
+import re
+import logging
+import functools
 import sys
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional, Tuple
 from config import Config
+from clip_onnx import ONNX_AVAILABLE, load_clip_onnx_session
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
 
 # CLIP imports for image embeddings
 try:
     import torch
+    import torch.nn.functional as F
     import clip
     from PIL import Image
     CLIP_AVAILABLE = True
@@ -22,6 +31,13 @@ except ImportError:
     CLIP_AVAILABLE = False
     print("Warning: CLIP not available. Install with: pip install torch torchvision git+https://github.com/openai/CLIP.git")
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
 # Pinecone imports
 try:
     from pinecone import Pinecone
@@ -30,16 +46,117 @@ except ImportError:
     PINECONE_AVAILABLE = False
     print("Warning: Pinecone library not installed. Install with: pip install pinecone")
 
+# Image filename keywords, in priority order, and the furniture type each one maps to
+_IMAGE_NAME_TYPES = {
+    'sofa': 'sofa',
+    'chair': 'chair',
+    'table': 'table',
+    'lamp': 'lighting',
+    'rug': 'rug',
+    'bench': 'bench',
+    'nightstand': 'nightstand'
+}
+_IMAGE_NAME_PRIORITY = {keyword: priority for priority, keyword in enumerate(_IMAGE_NAME_TYPES)}
+# Zero-width lookahead so one scan finds every keyword, even overlapping ones
+_IMAGE_NAME_TYPE_RE = re.compile('(?=(' + '|'.join(_IMAGE_NAME_TYPES) + '))')
+
+@functools.lru_cache(maxsize=None)
+def _load_clip_model(device: str, compiled: bool = False):
+    """Load CLIP ViT-B/32 once per (device, compiled) and share it across searcher instances."""
+    clip_model, clip_preprocess = clip.load("ViT-B/32", device=device)
+    clip_model.eval()
+    
+    # Run in FP16 on GPU so matmuls use Tensor Cores; CPU stays in FP32
+    if device == "cuda":
+        clip_model = clip_model.half()
+    
+    if compiled:
+        if not hasattr(torch, "compile"):
+            print("⚠️  torch.compile not available, using eager CLIP")
+        else:
+            try:
+                mode = "reduce-overhead" if device == "cuda" else "default"
+                clip_model.visual = torch.compile(clip_model.visual, mode=mode)
+                print("✅ CLIP image encoder compiled")
+            except Exception as e:
+                print(f"⚠️  torch.compile failed, using eager CLIP: {e}")
+    
+    return clip_model, clip_preprocess
+
+@functools.lru_cache(maxsize=1)
+def _get_pinecone_client():
+    """Create the Pinecone client once per process, or return None without an API key."""
+    pinecone_key = Config().get_pinecone_key()
+    if not pinecone_key:
+        return None
+    return Pinecone(api_key=pinecone_key)
+
+# Furniture types whose matches are restricted to an explicit list (keeps sofas and chairs apart)
+_RESTRICTED_CATEGORIES = {
+    'sofa': ['sofa', 'sofas', 'loveseat', 'loveseats'],
+    'chair': ['chair', 'chairs', 'loveseat', 'loveseats']
+}
+
+# Category mappings for other types
+_CATEGORY_GROUPS = {
+    'tables': ['table', 'tables', 'nightstand', 'nightstands', 'coffee_table', 'side_table'],
+    'lighting': ['lighting', 'lamp', 'lamps', 'pendant', 'sconce'],
+    'rugs': ['rug', 'rugs'],
+    'storage': ['bench', 'benches', 'storage_bench', 'ottoman']
+}
+
+# Special cases for similar items (excluding sofa/chair mixing)
+_SIMILAR_PAIRS = [
+    ('table', 'nightstand'),
+    ('lamp', 'lighting'),
+    ('bench', 'ottoman')
+]
+
+def _build_allowed_item_types() -> Dict[str, frozenset]:
+    """Map each known target furniture type to every item_type counted as the same category."""
+    allowed = {}
+    for types in _CATEGORY_GROUPS.values():
+        for furniture_type in types:
+            allowed.setdefault(furniture_type, set()).update(types)
+    for type1, type2 in _SIMILAR_PAIRS:
+        allowed.setdefault(type1, set()).add(type2)
+        allowed.setdefault(type2, set()).add(type1)
+    for furniture_type, types in _RESTRICTED_CATEGORIES.items():
+        allowed[furniture_type] = set(types)
+    return {furniture_type: frozenset(types | {furniture_type}) for furniture_type, types in allowed.items()}
+
+_ALLOWED_ITEM_TYPES = _build_allowed_item_types()
+
 class FurnitureSimilaritySearch:
     """Furniture similarity search using CLIP embeddings and Pinecone"""
     
-    def __init__(self):
-        """Initialize the similarity search system."""
+    # CLIP ViT-B/32 embedding dimension
+    EMBEDDING_DIM = 512
+    
+    # On-disk CLIP embeddings keyed by image content hash (same layout as clip_image_vectorization.py)
+    EMBEDDING_CACHE_DIR = os.path.join(".cache", "clip_embeddings")
+    
+    def __init__(self, backend: str = "torch", use_cache: bool = True, int8_queries: bool = False):
+        """Initialize the similarity search system.
+
+        backend selects the image encoder runtime: "torch" (eager PyTorch, default),
+        "compile" (torch.compile) or "onnx" (onnxruntime with TensorRT/CUDA providers).
+        use_cache reuses embeddings stored on disk for images whose contents have not changed.
+        int8_queries sends query vectors quantized to int8 levels, shrinking the request payload.
+        """
+        self.backend = backend
+        self.int8_queries = int8_queries
+        self.onnx_session = None
+        self.use_cache = use_cache
+        self.embedding_cache_dir = os.path.join(self.EMBEDDING_CACHE_DIR, "ViT-B-32")
         self.pinecone_client = None
         self.index = None
         self.clip_model = None
         self.clip_preprocess = None
         self.device = None
+        self.dtype = None
+        # Host staging buffer for input batches, pinned on CUDA and reused across calls
+        self._input_buffer = None
         self._init_clip()
         self._init_pinecone()
     
@@ -54,27 +171,42 @@ class FurnitureSimilaritySearch:
             self.device = "cuda" if torch.cuda.is_available() else "cpu"
             print(f"   Using device: {self.device}")
             
-            # Load CLIP model
-            self.clip_model, self.clip_preprocess = clip.load("ViT-B/32", device=self.device)
+            # Load CLIP model (shared with other instances in this process)
+            self.clip_model, self.clip_preprocess = _load_clip_model(self.device, compiled=self.backend == "compile")
+            self.dtype = torch.float16 if self.device == "cuda" else torch.float32
             print("✅ CLIP model loaded successfully")
             
+            if self.backend == "onnx":
+                self._init_onnx_backend()
+            
         except Exception as e:
             print(f"❌ CLIP initialization failed: {e}")
             self.clip_model = None
     
+    def _init_onnx_backend(self):
+        """Export the CLIP vision encoder to ONNX once and load it with onnxruntime."""
+        if not ONNX_AVAILABLE:
+            print("⚠️  onnxruntime not available, using PyTorch CLIP. Install with: pip install onnxruntime-gpu onnx")
+            return
+        
+        try:
+            self.onnx_session = load_clip_onnx_session(self.clip_model.visual, self.device, self.dtype)
+            print(f"✅ ONNX Runtime backend ready ({self.onnx_session.get_providers()[0]})")
+            
+        except Exception as e:
+            print(f"⚠️  ONNX backend initialization failed, using PyTorch CLIP: {e}")
+            self.onnx_session = None
+    
     def _init_pinecone(self):
         """Initialize Pinecone client."""
         try:
-            config = Config()
-            pinecone_key = config.get_pinecone_key()
+            # Initialize Pinecone with new API (one client per process)
+            self.pinecone_client = _get_pinecone_client()
             
-            if not pinecone_key:
+            if not self.pinecone_client:
                 print("❌ Pinecone API key not found")
                 return
             
-            # Initialize Pinecone with new API
-            self.pinecone_client = Pinecone(api_key=pinecone_key)
-            
             # Connect to Interior Define CLIP images index
             index_name = "interior-define-clip-images"
             self.index = self.pinecone_client.Index(index_name, host="https://interior-define-clip-images-7e5rvr1.svc.aped-4627-b74a.pinecone.io")
@@ -97,23 +229,30 @@ class FurnitureSimilaritySearch:
             
             print(f"📋 Checking master query log: {log_path}")
             
-            # Read the CSV file
-            df = pd.read_csv(log_path)
+            with open(log_path, newline='', encoding='utf-8') as f:
+                lines = f.read().splitlines()
             
-            if df.empty:
+            rows = [line for line in lines[1:] if line.strip()]
+            if not rows:
                 print("ℹ️ No queries found in master log")
                 return None
             
-            # Filter for queries where similarity_sufficed = 'no'
-            pending_similarity = df[df['similarity_sufficed'].str.lower() == 'no']
-            
-            if pending_similarity.empty:
+            # Scan from the newest query backwards and stop at the first one
+            # where similarity_sufficed = 'no'; older rows are never parsed
+            fieldnames = next(csv.reader(lines[:1]))
+            latest_query = None
+            for values in csv.reader(reversed(rows)):
+                row = dict(zip(fieldnames, values))
+                if row.get('similarity_sufficed', '').strip().lower() == 'no':
+                    latest_query = row
+                    break
+            
+            if latest_query is None:
                 print("✅ No queries pending similarity search")
                 return None
             
             # Get the latest query that needs similarity search
-            latest_query = pending_similarity.iloc[-1]
-            query_number = latest_query['request_number']
+            query_number = int(latest_query['request_number'])
             
             print(f"✅ Latest query pending similarity search: {query_number}")
             print(f"   Room Type: {latest_query['room_type']}")
@@ -131,15 +270,21 @@ class FurnitureSimilaritySearch:
         """Update the similarity_sufficed status in master query log."""
         try:
             master_log_path = "querries/master_querry_log.csv"
+            temp_path = master_log_path + ".tmp"
             
-            # Read the CSV
-            df = pd.read_csv(master_log_path)
-            
-            # Update the similarity_sufficed status for the specific query
-            df.loc[df['request_number'] == query_number, 'similarity_sufficed'] = status
+            # Stream the log row by row, changing only the similarity_sufficed cell of this query
+            with open(master_log_path, newline='', encoding='utf-8') as infile, \
+                    open(temp_path, 'w', newline='', encoding='utf-8') as outfile:
+                reader = csv.DictReader(infile)
+                writer = csv.DictWriter(outfile, fieldnames=reader.fieldnames, lineterminator='\n')
+                writer.writeheader()
+                for row in reader:
+                    if row['request_number'].strip() == str(query_number):
+                        row['similarity_sufficed'] = status
+                    writer.writerow(row)
             
-            # Save back to CSV
-            df.to_csv(master_log_path, index=False)
+            # Swap the rewritten log in atomically
+            os.replace(temp_path, master_log_path)
             
             print(f"✅ Updated similarity_sufficed to '{status}' for query {query_number}")
             
@@ -156,16 +301,17 @@ class FurnitureSimilaritySearch:
                 print(f"❌ Grayscale folder not found: {grayscale_folder}")
                 return []
             
-            # Find all grayscale images
-            grayscale_images = []
-            for filename in os.listdir(grayscale_folder):
-                if filename.lower().endswith(('.png', '.jpg', '.jpeg')) and 'grayscale' in filename.lower():
-                    image_path = os.path.join(grayscale_folder, filename)
-                    grayscale_images.append(image_path)
+            # Find all grayscale images in a single directory scan
+            with os.scandir(grayscale_folder) as entries:
+                grayscale_images = [
+                    entry.path for entry in entries
+                    if entry.name.lower().endswith(('.png', '.jpg', '.jpeg')) and 'grayscale' in entry.name.lower()
+                    and entry.is_file()
+                ]
             
             print(f"✅ Found {len(grayscale_images)} grayscale images")
             for img in grayscale_images:
-                print(f"   📁 {os.path.basename(img)}")
+                logger.debug(f"   📁 {os.path.basename(img)}")
             
             return grayscale_images
             
@@ -173,51 +319,159 @@ class FurnitureSimilaritySearch:
             print(f"❌ Error getting grayscale images: {e}")
             return []
     
-    def encode_image(self, image_path: str) -> Optional[str]:
-        """Encode image to base64 for OpenAI API."""
+    def _load_image_input(self, image_path: str) -> Optional["torch.Tensor"]:
+        """Decode an image and apply CLIP preprocessing, or return None if it cannot be read."""
         try:
-            with open(image_path, "rb") as image_file:
-                image_data = base64.b64encode(image_file.read()).decode('utf-8')
-            return image_data
+            image = Image.open(image_path).convert('RGB')
+            return self.clip_preprocess(image)
         except Exception as e:
-            print(f"❌ Error encoding image {image_path}: {e}")
+            logger.warning(f"❌ Error loading image {image_path}: {e}")
             return None
     
-    def get_clip_embedding(self, image_path: str) -> Optional[List[float]]:
-        """Get CLIP embedding for an image."""
+    def _stage_batch(self, image_inputs: List["torch.Tensor"]) -> "torch.Tensor":
+        """Stack preprocessed images into the reusable host buffer and move them to the device."""
+        shape = (len(image_inputs),) + tuple(image_inputs[0].shape)
+        if (self._input_buffer is None or self._input_buffer.shape[0] < shape[0]
+                or self._input_buffer.shape[1:] != shape[1:]):
+            self._input_buffer = torch.empty(shape, pin_memory=self.device == "cuda")
+        
+        batch = self._input_buffer[:shape[0]]
+        torch.stack(image_inputs, out=batch)
+        # Pinned memory lets the host-to-device copy run asynchronously
+        return batch.to(self.device, dtype=self.dtype, non_blocking=True)
+    
+    def _image_hash(self, image_path: str) -> Optional[str]:
+        """Return the SHA-1 of an image file's contents, or None if it cannot be read."""
+        try:
+            with open(image_path, 'rb') as f:
+                return hashlib.sha1(f.read()).hexdigest()
+        except OSError:
+            return None
+    
+    def _load_cached_embedding(self, image_hash: Optional[str]) -> Optional[np.ndarray]:
+        """Load a cached embedding for an image hash, or None on a miss."""
+        if not image_hash:
+            return None
+        
+        cache_path = os.path.join(self.embedding_cache_dir, image_hash + '.npy')
+        if not os.path.exists(cache_path):
+            return None
+        
+        try:
+            embedding = np.load(cache_path)
+            return embedding if embedding.shape == (self.EMBEDDING_DIM,) else None
+        except Exception:
+            return None
+    
+    def _save_cached_embedding(self, image_hash: Optional[str], embedding: np.ndarray):
+        """Persist an embedding under its image hash."""
+        if not image_hash:
+            return
+        
+        try:
+            np.save(os.path.join(self.embedding_cache_dir, image_hash + '.npy'), embedding)
+        except Exception as e:
+            logger.warning(f"⚠️  Could not cache embedding {image_hash}: {e}")
+    
+    def get_clip_embeddings(self, image_paths: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Get CLIP embeddings for several images with a single forward pass.
+
+        Returns a float32 [N, 512] array aligned with image_paths and a boolean mask
+        marking which rows were successfully embedded.
+        """
+        embeddings = np.zeros((len(image_paths), self.EMBEDDING_DIM), dtype=np.float32)
+        valid = np.zeros(len(image_paths), dtype=bool)
         try:
             if not self.clip_model:
                 print("❌ CLIP model not available")
-                return None
+                return embeddings, valid
+            
+            # Serve unchanged images from the on-disk cache and only encode new or changed ones
+            image_hashes: List[Optional[str]] = [None] * len(image_paths)
+            if self.use_cache:
+                os.makedirs(self.embedding_cache_dir, exist_ok=True)
+                for position, image_path in enumerate(image_paths):
+                    image_hashes[position] = self._image_hash(image_path)
+                    cached = self._load_cached_embedding(image_hashes[position])
+                    if cached is not None:
+                        embeddings[position] = cached
+                        valid[position] = True
+                
+                if valid.any():
+                    print(f"♻️  Loaded {int(valid.sum())} CLIP embeddings from cache")
+            
+            encode_positions = np.flatnonzero(~valid).tolist()
+            if not encode_positions:
+                return embeddings, valid
+            
+            print(f"🔍 CLIP embedding {len(encode_positions)} images")
+            
+            # Load and preprocess images in parallel (PIL releases the GIL while decoding);
+            # unreadable ones are left out of the batch
+            with ThreadPoolExecutor(max_workers=min(8, len(encode_positions))) as executor:
+                loaded = list(executor.map(self._load_image_input, [image_paths[position] for position in encode_positions]))
+            positions = [position for position, image_input in zip(encode_positions, loaded) if image_input is not None]
+            image_inputs = [image_input for image_input in loaded if image_input is not None]
+            
+            if not image_inputs:
+                return embeddings, valid
+            
+            if self.onnx_session is not None:
+                # ONNX Runtime consumes host arrays directly; the providers handle device transfer
+                onnx_input = torch.stack(image_inputs).numpy().astype(np.float16 if self.dtype == torch.float16 else np.float32)
+                batch_embeddings = self.onnx_session.run(None, {'pixel_values': onnx_input})[0].astype(np.float32)
+                batch_embeddings /= np.linalg.norm(batch_embeddings, axis=1, keepdims=True)
+            else:
+                image_input = self._stage_batch(image_inputs)
+                
+                # Get image features for the whole batch
+                with torch.inference_mode():
+                    # Back to FP32 before normalizing to avoid FP16 underflow
+                    image_features = self.clip_model.encode_image(image_input).float()
+                    # Normalize features
+                    image_features = F.normalize(image_features, dim=-1)
+                    batch_embeddings = image_features.cpu().numpy()
             
-            print(f"🔍 CLIP embedding image: {os.path.basename(image_path)}")
+            embeddings[positions] = batch_embeddings
+            valid[positions] = True
             
-            # Load and preprocess image
-            image = Image.open(image_path).convert('RGB')
-            image_input = self.clip_preprocess(image).unsqueeze(0).to(self.device)
+            print(f"✅ Generated {len(positions)} CLIP embeddings (dim: {embeddings.shape[1]})")
             
-            # Get image features
-            with torch.no_grad():
-                image_features = self.clip_model.encode_image(image_input)
-                # Normalize features
-                image_features = image_features / image_features.norm(dim=-1, keepdim=True)
-                # Convert to list
-                embedding = image_features.cpu().numpy().flatten().tolist()
+            if self.use_cache:
+                for position in positions:
+                    self._save_cached_embedding(image_hashes[position], embeddings[position])
             
-            print(f"✅ Generated CLIP embedding (dim: {len(embedding)})")
-            return embedding
+            return embeddings, valid
             
         except Exception as e:
-            print(f"❌ Error getting CLIP embedding for {image_path}: {e}")
-            return None
+            print(f"❌ Error getting CLIP embeddings: {e}")
+            return embeddings, valid
     
-    def search_similar_furniture(self, embedding: List[float], furniture_type: str, top_k: int = 5) -> List[Dict]:
+    def get_clip_embedding(self, image_path: str) -> Optional[np.ndarray]:
+        """Get CLIP embedding for an image."""
+        embeddings, valid = self.get_clip_embeddings([image_path])
+        return embeddings[0] if valid[0] else None
+    
+    def _query_vector(self, embedding: np.ndarray) -> List[float]:
+        """Convert an embedding to the list the Pinecone client expects, optionally int8-quantized.
+
+        The index uses cosine similarity, which ignores vector length, so the embedding can be
+        rescaled to span [-127, 127] and rounded without changing what it points at.
+        """
+        if not self.int8_queries:
+            return embedding.tolist()
+        
+        scale = 127.0 / max(float(np.abs(embedding).max()), 1e-12)
+        return np.round(embedding * scale).astype(np.int8).astype(np.float32).tolist()
+    
+    def search_similar_furniture(self, embedding: np.ndarray, furniture_type: str, top_k: int = 5) -> List[Dict]:
         """Search for similar furniture in Pinecone, filtered by furniture type."""
         try:
-            # Query Pinecone with more results to account for filtering
+            # Let Pinecone filter by furniture type so every returned match is usable
             results = self.index.query(
-                vector=embedding,
-                top_k=top_k * 3,  # Get more results to filter by type
+                vector=self._query_vector(embedding),
+                top_k=top_k,
+                filter={'item_type': {'$in': self._allowed_item_types(furniture_type.lower())}},
                 include_metadata=True
             )
             
@@ -225,7 +479,7 @@ class FurnitureSimilaritySearch:
             for match in results['matches']:
                 item_type = match['metadata'].get('item_type', '').lower()
                 
-                # Filter by furniture type (with some flexibility for similar types)
+                # Defensive check; the server-side filter should already guarantee this
                 if self._is_same_category(item_type, furniture_type.lower()):
                     similar_items.append({
                         'catalog_number': match['id'],
@@ -242,80 +496,37 @@ class FurnitureSimilaritySearch:
                     if len(similar_items) >= top_k:
                         break
             
-            print(f"    ✅ Found {len(similar_items)} {furniture_type} items (filtered from {len(results['matches'])} total)")
+            logger.debug(f"    ✅ Found {len(similar_items)} {furniture_type} items (filtered from {len(results['matches'])} total)")
             return similar_items
             
         except Exception as e:
-            print(f"❌ Error searching Pinecone: {e}")
+            logger.error(f"❌ Error searching Pinecone: {e}")
             return []
     
+    def _allowed_item_types(self, target_type: str) -> List[str]:
+        """List the item_type values that count as the same category as target_type."""
+        return sorted(_ALLOWED_ITEM_TYPES.get(target_type, {target_type}))
+    
     def _is_same_category(self, item_type: str, target_type: str) -> bool:
         """Check if two furniture types are in the same category."""
-        # Direct match
-        if item_type == target_type:
-            return True
-        
-        # Special handling for sofas - be more restrictive
-        if target_type == 'sofa':
-            return item_type in ['sofa', 'sofas', 'loveseat', 'loveseats']
-        
-        # Special handling for chairs - exclude sofas
-        if target_type == 'chair':
-            return item_type in ['chair', 'chairs', 'loveseat', 'loveseats']
-        
-        # Define category mappings for other types
-        categories = {
-            'tables': ['table', 'tables', 'nightstand', 'nightstands', 'coffee_table', 'side_table'],
-            'lighting': ['lighting', 'lamp', 'lamps', 'pendant', 'sconce'],
-            'rugs': ['rug', 'rugs'],
-            'storage': ['bench', 'benches', 'storage_bench', 'ottoman']
-        }
-        
-        # Check if both types are in the same category
-        for category, types in categories.items():
-            if item_type in types and target_type in types:
-                return True
-        
-        # Special cases for similar items (excluding sofa/chair mixing)
-        similar_pairs = [
-            ('table', 'nightstand'),
-            ('lamp', 'lighting'),
-            ('bench', 'ottoman')
-        ]
-        
-        for type1, type2 in similar_pairs:
-            if (item_type == type1 and target_type == type2) or (item_type == type2 and target_type == type1):
-                return True
-        
-        return False
+        return item_type == target_type or item_type in _ALLOWED_ITEM_TYPES.get(target_type, ())
     
     def _get_furniture_type_from_image_name(self, image_name: str) -> str:
         """Extract furniture type from image filename."""
         image_name_lower = image_name.lower()
         
-        # Map image name patterns to furniture types
-        if 'sofa' in image_name_lower:
-            return 'sofa'
-        elif 'chair' in image_name_lower:
-            return 'chair'
-        elif 'table' in image_name_lower:
-            return 'table'
-        elif 'lamp' in image_name_lower:
-            return 'lighting'
-        elif 'rug' in image_name_lower:
-            return 'rug'
-        elif 'bench' in image_name_lower:
-            return 'bench'
-        elif 'nightstand' in image_name_lower:
-            return 'nightstand'
-        else:
-            # Default fallback - try to extract from filename
-            if 'extracted' in image_name_lower:
-                # Extract the part before 'extracted'
-                parts = image_name_lower.split('_extracted')
-                if parts:
-                    return parts[0]
-            return 'unknown'
+        # Map image name patterns to furniture types; the highest-priority keyword wins
+        keywords = _IMAGE_NAME_TYPE_RE.findall(image_name_lower)
+        if keywords:
+            return _IMAGE_NAME_TYPES[min(keywords, key=_IMAGE_NAME_PRIORITY.__getitem__)]
+        
+        # Default fallback - try to extract from filename
+        if 'extracted' in image_name_lower:
+            # Extract the part before 'extracted'
+            parts = image_name_lower.split('_extracted')
+            if parts:
+                return parts[0]
+        return 'unknown'
     
     def process_query_images(self, query_number: int) -> Dict[str, List[Dict]]:
         """Process all grayscale images for a query and find similar furniture."""
@@ -328,29 +539,39 @@ class FurnitureSimilaritySearch:
                 print("❌ No grayscale images found")
                 return {}
             
-            results = {}
+            # Get CLIP embeddings for all images in one batch
+            embeddings, valid = self.get_clip_embeddings(grayscale_images)
             
-            for image_path in grayscale_images:
+            searches = []
+            for image_path, embedding, embedded in zip(grayscale_images, embeddings, valid):
                 image_name = os.path.basename(image_path)
-                print(f"\n🔄 Processing {image_name}...")
+                logger.debug(f"🔄 Processing {image_name}...")
                 
                 # Determine furniture type from image name
                 furniture_type = self._get_furniture_type_from_image_name(image_name)
-                print(f"    🏷️  Detected furniture type: {furniture_type}")
+                logger.debug(f"    🏷️  Detected furniture type: {furniture_type}")
                 
-                # Get CLIP embedding directly from image
-                embedding = self.get_clip_embedding(image_path)
-                if not embedding:
-                    print(f"❌ Failed to get CLIP embedding for {image_name}")
+                if not embedded:
+                    logger.warning(f"❌ Failed to get CLIP embedding for {image_name}")
                     continue
                 
-                # Search for similar furniture of the same type
-                similar_items = self.search_similar_furniture(embedding, furniture_type, top_k=5)
+                searches.append((image_name, furniture_type, embedding))
+            
+            if not searches:
+                return {}
+            
+            # Search for similar furniture of the same type; queries are network-bound, so run them concurrently
+            image_names, furniture_types, query_embeddings = zip(*searches)
+            with ThreadPoolExecutor(max_workers=min(16, len(searches))) as executor:
+                search_results = list(executor.map(self.search_similar_furniture, query_embeddings, furniture_types))
+            
+            results = {}
+            for image_name, furniture_type, similar_items in zip(image_names, furniture_types, search_results):
                 if similar_items:
                     results[image_name] = similar_items
-                    print(f"✅ Found {len(similar_items)} similar {furniture_type} items for {image_name}")
+                    logger.info(f"✅ Found {len(similar_items)} similar {furniture_type} items for {image_name}")
                 else:
-                    print(f"❌ No similar {furniture_type} items found for {image_name}")
+                    logger.warning(f"❌ No similar {furniture_type} items found for {image_name}")
             
             return results
             
@@ -376,32 +597,29 @@ class FurnitureSimilaritySearch:
                 print(f"   Color: {item.get('color', 'N/A')}")
                 print()
     
+    RESULT_FIELDS = ['query_number', 'image_name', 'rank', 'catalog_number', 'similarity_score', 'item_name', 'item_type', 'price', 'color', 'image_url', 'link']
+    
+    def _result_rows(self, query_number: int, results: Dict[str, List[Dict]]) -> List[tuple]:
+        """Flatten results to one tuple per similar item, in RESULT_FIELDS order."""
+        return [
+            (query_number, image_name, i, item['catalog_number'], item['similarity_score'], item['item_name'],
+             item['item_type'], item.get('price', ''), item.get('color', ''), item.get('image_url', ''), item.get('link', ''))
+            for image_name, similar_items in results.items()
+            for i, item in enumerate(similar_items, 1)
+        ]
+    
     def save_results_to_csv(self, query_number: int, results: Dict[str, List[Dict]]) -> str:
         """Save similarity search results to CSV."""
         try:
             output_path = f"querries/query_{query_number}/similarity_results.csv"
             
+            fieldnames = self.RESULT_FIELDS
+            rows = self._result_rows(query_number, results)
+            
             with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ['query_number', 'image_name', 'rank', 'catalog_number', 'similarity_score', 'item_name', 'item_type', 'price', 'color', 'image_url', 'link']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                
-                writer.writeheader()
-                
-                for image_name, similar_items in results.items():
-                    for i, item in enumerate(similar_items, 1):
-                        writer.writerow({
-                            'query_number': query_number,
-                            'image_name': image_name,
-                            'rank': i,
-                            'catalog_number': item['catalog_number'],
-                            'similarity_score': item['similarity_score'],
-                            'item_name': item['item_name'],
-                            'item_type': item['item_type'],
-                            'price': item.get('price', ''),
-                            'color': item.get('color', ''),
-                            'image_url': item.get('image_url', ''),
-                            'link': item.get('link', '')
-                        })
+                writer = csv.writer(csvfile)
+                writer.writerow(fieldnames)
+                writer.writerows(rows)
             
             print(f"✅ Results saved to CSV: {output_path}")
             return output_path
@@ -409,14 +627,49 @@ class FurnitureSimilaritySearch:
         except Exception as e:
             print(f"❌ Error saving results to CSV: {e}")
             return ""
+    
+    def save_results_to_parquet(self, query_number: int, results: Dict[str, List[Dict]]) -> str:
+        """Save similarity search results to a zstd-compressed Parquet file next to the CSV."""
+        if not PYARROW_AVAILABLE:
+            print("⚠️  pyarrow not available, skipping Parquet export. Install with: pip install pyarrow")
+            return ""
+        
+        try:
+            output_path = f"querries/query_{query_number}/similarity_results.parquet"
+            
+            rows = self._result_rows(query_number, results)
+            columns = list(zip(*rows)) if rows else [()] * len(self.RESULT_FIELDS)
+            table = pa.table({field: list(values) for field, values in zip(self.RESULT_FIELDS, columns)})
+            pq.write_table(table, output_path, compression='zstd')
+            
+            print(f"✅ Results saved to Parquet: {output_path}")
+            return output_path
+            
+        except Exception as e:
+            print(f"❌ Error saving results to Parquet: {e}")
+            return ""
 
 def main():
     """Main function to perform furniture similarity search."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Find catalog furniture similar to the latest query\'s grayscale images')
+    parser.add_argument('--backend', choices=['torch', 'compile', 'onnx'], default='torch',
+                       help='Image encoder runtime: eager PyTorch, torch.compile, or ONNX Runtime with TensorRT/CUDA (default: torch)')
+    parser.add_argument('--no-cache', action='store_true', help='Re-encode every image instead of reusing cached embeddings')
+    parser.add_argument('--int8-queries', action='store_true', help='Quantize query vectors to int8 levels to shrink Pinecone requests')
+    parser.add_argument('--parquet', action='store_true', help='Also write the results as Parquet next to the CSV')
+    parser.add_argument('--verbose', action='store_true', help='Log per-image progress')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format='%(message)s')
+    
     print("🔍 Furniture Similarity Search")
     print("=" * 40)
     
     # Initialize
-    searcher = FurnitureSimilaritySearch()
+    searcher = FurnitureSimilaritySearch(backend=args.backend, use_cache=not args.no_cache,
+                                         int8_queries=args.int8_queries)
     
     if not searcher.is_available():
         print("❌ Similarity search not available. Please check API keys.")
@@ -445,6 +698,8 @@ def main():
         
         # Save results to CSV
         csv_path = searcher.save_results_to_csv(latest_query, results)
+        if args.parquet:
+            searcher.save_results_to_parquet(latest_query, results)
         
         # Update similarity status to "yes"
         searcher.update_similarity_status(latest_query, "yes")
@@ -6,82 +6,232 @@ Uses GPT-Image-1 to extract furniture from images with clean backgrounds
 
 import os
 import base64
+import binascii
 import csv
+import json
+import mmap
+import shutil
+import time
+import asyncio
 import datetime
-import pandas as pd
-from typing import Optional, List, Tuple
+import functools
+import hashlib
+import importlib
+import importlib.util
+import math
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Dict, Iterator, Optional, List, Tuple
 from config import Config
-from openai import OpenAI
 
-# PIL imports for image processing
-try:
-    from PIL import Image
-    PIL_AVAILABLE = True
-except ImportError:
-    PIL_AVAILABLE = False
+if TYPE_CHECKING:
+    import httpx
+    import pandas as pd
+    from openai import OpenAI, AsyncOpenAI
+
+# pandas, OpenCV, PIL, pyarrow and openai are imported on first use through _require, so a run
+# with nothing pending starts quickly; availability is checked without importing them
+@functools.lru_cache(maxsize=None)
+def _require(name: str):
+    """Import a heavy module the first time it is needed, or return None if it can't be imported."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+# PIL for image processing
+PIL_AVAILABLE = importlib.util.find_spec("PIL") is not None
+if not PIL_AVAILABLE:
     print("Warning: PIL library not installed. Install with: pip install Pillow")
 
-# OpenCV imports for grayscale conversion
-try:
-    import cv2
-    OPENCV_AVAILABLE = True
-except ImportError:
-    OPENCV_AVAILABLE = False
+# Optional Arrow support: master log scans and Parquet export of detection results
+PYARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+# OpenCV for resizing and grayscale conversion
+OPENCV_AVAILABLE = importlib.util.find_spec("cv2") is not None
+if not OPENCV_AVAILABLE:
     print("Warning: OpenCV library not installed. Install with: pip install opencv-python")
 
+def _pil_simd_version() -> Optional[str]:
+    """Pillow-SIMD version string if that build is installed, else None."""
+    PIL = _require("PIL")
+    # Pillow-SIMD publishes versions like "9.5.0.post1"; its resize kernels use SSE4/AVX2
+    if PIL is not None and ".post" in PIL.__version__:
+        return PIL.__version__
+    return None
+
+# HTTP/2 needs the optional h2 package; without it httpx stays on keep-alive HTTP/1.1
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+def _http_pool_options() -> dict:
+    """Connection-pool settings shared by every httpx client this module creates."""
+    httpx = _require("httpx")
+    return {"http2": _HTTP2_AVAILABLE, "limits": httpx.Limits(max_connections=20, max_keepalive_connections=20)}
+
+@functools.lru_cache(maxsize=1)
+def _get_openai_client() -> Optional["OpenAI"]:
+    """Create the OpenAI client once per process on a pooled keep-alive connection, or None without a key."""
+    api_key = Config().get_openai_key()
+    if not api_key:
+        return None
+    openai, httpx = _require("openai"), _require("httpx")
+    return openai.OpenAI(api_key=api_key, http_client=httpx.Client(**_http_pool_options()))
+
+_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+
+def _iter_images(folder: str) -> Iterator[str]:
+    """Yield the paths of PNG/JPEG files in a folder, in directory order."""
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name.rpartition('.')[2].lower() in _IMAGE_EXTENSIONS and entry.is_file():
+                yield entry.path
+
+@functools.lru_cache(maxsize=1)
+def _get_download_client() -> "httpx.Client":
+    """Shared client for fetching URL-returned images, so downloads reuse DNS and TLS sessions."""
+    return _require("httpx").Client(**_http_pool_options(), timeout=30.0, follow_redirects=True)
+
+def _file_sha256(path: str) -> str:
+    """SHA-256 of a file's contents, hashed straight from a memory map."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.sha256().hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return hashlib.sha256(mm).hexdigest()
+
+def _encode_file_base64(path: str) -> str:
+    """Base64-encode a file straight from a read-only memory map, without a separate read buffer."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap cannot map an empty file
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return base64.b64encode(mm).decode('ascii')
+
+class _RateLimiter:
+    """Spaces out async requests so at most `per_minute` start in any minute."""
+    
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute
+        self._next_slot = 0.0
+    
+    async def acquire(self):
+        # Reserve the next free slot before sleeping so concurrent callers queue up behind it
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
 class GPTFurnitureExtractor:
     """GPT-Image-1 based furniture extractor"""
     
-    def __init__(self):
-        """Initialize the GPT furniture extractor."""
+    # Upper bound on concurrent GPT-Image-1 edits, to stay inside rate limits
+    MAX_CONCURRENT_EDITS = 10
+    
+    # Converted designed-room PNGs keyed by the SHA-256 of the source image
+    PNG_CACHE_DIR = os.path.join(".cache", "png_conversions")
+    
+    DETECTION_CSV_PATH = "generated_images/furniture_detection_results.csv"
+    DETECTION_FIELDS = ['query_number', 'timestamp', 'image_path', 'items', 'colors']
+    
+    def __init__(self, max_concurrency: int = MAX_CONCURRENT_EDITS, edits_per_minute: Optional[float] = None,
+                 grid_extraction: bool = False, connect: bool = True):
+        """Initialize the GPT furniture extractor; connect=False defers creating the OpenAI client."""
         self.client = None
-        self._init_openai()
+        self.max_concurrency = max(1, max_concurrency)
+        # Extract all items of a query with one grid edit instead of one edit per item
+        self.grid_extraction = grid_extraction
+        # Optional cap on GPT-Image-1 edit requests started per minute
+        self._edit_limiter = _RateLimiter(edits_per_minute) if edits_per_minute else None
+        self.master_log_path = "querries/master_querry_log.csv"
+        # Parsed master log, reused until the file changes on disk
+        self._master_df = None
+        self._master_stamp = None
+        self._master_index = None
+        # Detection rows waiting for flush_detection_buffer
+        self._detection_buffer = []
+        if connect:
+            self._init_openai()
     
     def _init_openai(self):
         """Initialize OpenAI client."""
         try:
-            config = Config()
-            api_key = config.get_openai_key()
+            # One client (and connection pool) per process
+            self.client = _get_openai_client()
             
-            if not api_key:
+            if not self.client:
                 print("❌ OpenAI API key not found")
                 return
             
-            self.client = OpenAI(api_key=api_key)
             print("✅ OpenAI client initialized successfully")
             
         except Exception as e:
             print(f"❌ OpenAI initialization failed: {e}")
             self.client = None
     
-    def check_master_query_log(self) -> Optional[int]:
-        """Check master query log for queries that need extraction."""
+    def _master_file_stamp(self) -> Tuple[int, int]:
+        """(mtime, size) of the master query log, used to tell whether the cached frame is stale."""
+        stat = os.stat(self.master_log_path)
+        return stat.st_mtime_ns, stat.st_size
+    
+    def _load_master(self) -> Optional["pd.DataFrame"]:
+        """Return the master query log, re-reading it only when its mtime or size changes."""
+        if not os.path.exists(self.master_log_path):
+            print(f"❌ Master query log not found: {self.master_log_path}")
+            return None
+        
+        stamp = self._master_file_stamp()
+        if self._master_df is None or stamp != self._master_stamp:
+            pd = _require("pandas")
+            self._master_df = pd.read_csv(self.master_log_path)
+            self._master_stamp = stamp
+            # Hash index over request_number so status updates find their rows without a column scan
+            self._master_index = pd.Index(self._master_df['request_number'])
+        return self._master_df
+    
+    def get_pending_queries(self) -> List[int]:
+        """Return every query number whose extraction is still pending."""
         try:
-            master_log_path = "querries/master_querry_log.csv"
+            if not os.path.exists(self.master_log_path):
+                print(f"❌ Master query log not found: {self.master_log_path}")
+                return []
             
-            if not os.path.exists(master_log_path):
-                print(f"❌ Master query log not found: {master_log_path}")
-                return None
+            if PYARROW_AVAILABLE and (self._master_df is None or self._master_file_stamp() != self._master_stamp):
+                # No fresh frame cached: parse just the two needed columns in Arrow and filter natively
+                pacsv, pc = _require("pyarrow.csv"), _require("pyarrow.compute")
+                table = pacsv.read_csv(self.master_log_path, convert_options=pacsv.ConvertOptions(
+                    include_columns=['request_number', 'extraction_sufficed']
+                ))
+                mask = pc.equal(table['extraction_sufficed'], 'no')
+                pending = pc.unique(pc.filter(table['request_number'], mask))
+                return sorted(int(q) for q in pending.to_pylist())
             
             # Read the master query log
-            df = pd.read_csv(master_log_path)
+            df = self._load_master()
+            if df is None:
+                return []
             
             # Find queries where extraction_sufficed is "no"
             pending_extractions = df[df['extraction_sufficed'] == 'no']
-            
-            if pending_extractions.empty:
-                print("✅ No queries pending extraction")
-                return None
-            
-            # Get the latest query number that needs extraction
-            latest_query = pending_extractions['request_number'].max()
-            print(f"🔍 Found query {latest_query} pending extraction")
-            
-            return latest_query
+            return sorted(int(q) for q in pending_extractions['request_number'].unique())
             
         except Exception as e:
             print(f"❌ Error checking master query log: {e}")
+            return []
+    
+    def check_master_query_log(self) -> Optional[int]:
+        """Check master query log for queries that need extraction."""
+        pending = self.get_pending_queries()
+        
+        if not pending:
+            print("✅ No queries pending extraction")
             return None
+        
+        # Get the latest query number that needs extraction
+        latest_query = pending[-1]
+        print(f"🔍 Found query {latest_query} pending extraction")
+        
+        return latest_query
     
     def find_designed_room_image(self, query_number: int) -> Optional[str]:
         """Find the designed room image for a query."""
@@ -92,18 +242,13 @@ class GPTFurnitureExtractor:
                 print(f"❌ Designed room folder not found: {designed_room_path}")
                 return None
             
-            # Look for image files in the designed room folder
-            image_files = []
-            for file in os.listdir(designed_room_path):
-                if file.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    image_files.append(os.path.join(designed_room_path, file))
+            # Use the first image found in the designed room folder
+            image_path = next(_iter_images(designed_room_path), None)
             
-            if not image_files:
+            if image_path is None:
                 print(f"❌ No images found in designed room folder: {designed_room_path}")
                 return None
             
-            # Use the first image found
-            image_path = image_files[0]
             print(f"✅ Found designed room image: {os.path.basename(image_path)}")
             return image_path
             
@@ -113,19 +258,40 @@ class GPTFurnitureExtractor:
     
     def update_extraction_status(self, query_number: int, status: str = "yes"):
         """Update the extraction_sufficed status in master query log."""
+        self.update_extraction_statuses({query_number: status})
+    
+    def update_extraction_statuses(self, statuses: Dict[int, str]):
+        """Update extraction_sufficed for several queries with a single write of the master query log."""
         try:
-            master_log_path = "querries/master_querry_log.csv"
-            
-            # Read the CSV
-            df = pd.read_csv(master_log_path)
+            df = self._load_master()
+            if df is None:
+                return
             
-            # Update the extraction_sufficed status for the specific query
-            df.loc[df['request_number'] == query_number, 'extraction_sufficed'] = status
+            status_col = df.columns.get_loc('extraction_sufficed')
+            changed = []
+            for query_number, status in statuses.items():
+                # Update the extraction_sufficed status for the specific query
+                rows = self._master_index.get_indexer_for([query_number])
+                rows = rows[rows >= 0]  # -1 marks a missing key
+                if len(rows) == 0:
+                    print(f"⚠️ Query {query_number} not found in master query log")
+                    continue
+                if (df.iloc[rows, status_col] == status).all():
+                    print(f"ℹ️ extraction_sufficed already '{status}' for query {query_number}")
+                    continue
+                df.iloc[rows, status_col] = status
+                changed.append((query_number, status))
+            
+            if not changed:
+                # Nothing changed, so leave the file untouched
+                return
             
-            # Save back to CSV
-            df.to_csv(master_log_path, index=False)
+            # Save back to CSV and remember the stamp so the cached frame stays valid
+            df.to_csv(self.master_log_path, index=False)
+            self._master_stamp = self._master_file_stamp()
             
-            print(f"✅ Updated extraction_sufficed to '{status}' for query {query_number}")
+            for query_number, status in changed:
+                print(f"✅ Updated extraction_sufficed to '{status}' for query {query_number}")
             
         except Exception as e:
             print(f"❌ Error updating extraction status: {e}")
@@ -183,6 +349,40 @@ class GPTFurnitureExtractor:
             print(f"❌ Error creating query CSV: {e}")
             return ""
     
+    def _cv_pipeline(self, input_path: str, png_path: Optional[str] = None, gray_path: Optional[str] = None,
+                     max_dim: Optional[int] = None) -> bool:
+        """Decode an image once, optionally downscale it, and write a PNG and/or grayscale copy."""
+        cv2 = _require("cv2")
+        # Keep alpha: transparent regions are meaningful to GPT-Image-1 edits
+        img = cv2.imread(input_path, cv2.IMREAD_UNCHANGED)
+        if img is None:
+            print(f"❌ Could not read image: {input_path}")
+            return False
+        
+        # Resize if image is too large (keep aspect ratio)
+        height, width = img.shape[:2]
+        if max_dim and max(height, width) > max_dim:
+            scale = max_dim / max(height, width)
+            img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            print(f"✅ Resized image to {img.shape[1]}x{img.shape[0]}")
+        
+        if png_path and not cv2.imwrite(png_path, img, [cv2.IMWRITE_PNG_COMPRESSION, 3]):
+            print(f"❌ Could not write image: {png_path}")
+            return False
+        
+        if gray_path:
+            if img.ndim == 2:
+                gray_img = img
+            elif img.shape[2] == 4:
+                gray_img = cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY)
+            else:
+                gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            if not cv2.imwrite(gray_path, gray_img):
+                print(f"❌ Could not write image: {gray_path}")
+                return False
+        
+        return True
+    
     def convert_to_grayscale_opencv(self, input_path: str, output_path: str) -> bool:
         """Convert image to grayscale using OpenCV."""
         if not OPENCV_AVAILABLE:
@@ -192,18 +392,9 @@ class GPTFurnitureExtractor:
         try:
             print(f"🔄 Converting to grayscale: {os.path.basename(input_path)}")
             
-            # Read the image
-            img = cv2.imread(input_path)
-            if img is None:
-                print(f"❌ Could not read image: {input_path}")
+            if not self._cv_pipeline(input_path, gray_path=output_path):
                 return False
             
-            # Convert to grayscale
-            gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            
-            # Save the grayscale image
-            cv2.imwrite(output_path, gray_img)
-            
             print(f"✅ Grayscale image saved: {os.path.basename(output_path)}")
             return True
             
@@ -211,6 +402,14 @@ class GPTFurnitureExtractor:
             print(f"❌ Error converting to grayscale: {e}")
             return False
     
+    def _grayscale_worker(self, input_path: str, output_path: str) -> bool:
+        """Thread-pool body for grayscale conversion; only failures are printed."""
+        try:
+            return self._cv_pipeline(input_path, gray_path=output_path)
+        except Exception as e:
+            print(f"❌ Error converting {os.path.basename(input_path)} to grayscale: {e}")
+            return False
+    
     def process_generated_images_to_grayscale(self, query_number: int) -> List[str]:
         """Process all generated furniture images and create grayscale versions."""
         try:
@@ -221,22 +420,24 @@ class GPTFurnitureExtractor:
                 print(f"❌ Generated furniture folder not found: {generated_furniture_folder}")
                 return []
             
-            grayscale_images = []
-            
-            # Process all images in the generated_furniture folder
-            for filename in os.listdir(generated_furniture_folder):
-                if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    input_path = os.path.join(generated_furniture_folder, filename)
-                    
-                    # Create grayscale filename
-                    name, ext = os.path.splitext(filename)
-                    grayscale_filename = f"{name}_grayscale{ext}"
-                    output_path = os.path.join(grayscale_folder, grayscale_filename)
-                    
-                    # Convert to grayscale
-                    if self.convert_to_grayscale_opencv(input_path, output_path):
-                        grayscale_images.append(output_path)
+            if not OPENCV_AVAILABLE:
+                print("❌ OpenCV not available for grayscale conversion")
+                return []
+            
+            # Pair every image in the generated_furniture folder with its grayscale filename
+            input_paths = []
+            output_paths = []
+            for input_path in _iter_images(generated_furniture_folder):
+                name, ext = os.path.splitext(os.path.basename(input_path))
+                input_paths.append(input_path)
+                output_paths.append(os.path.join(grayscale_folder, f"{name}_grayscale{ext}"))
             
+            # OpenCV releases the GIL while decoding, converting and encoding, so threads overlap
+            print(f"🔄 Converting {len(input_paths)} images to grayscale...")
+            with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+                converted = list(executor.map(self._grayscale_worker, input_paths, output_paths))
+            
+            grayscale_images = [path for path, ok in zip(output_paths, converted) if ok]
             print(f"✅ Created {len(grayscale_images)} grayscale images")
             return grayscale_images
             
@@ -253,13 +454,14 @@ class GPTFurnitureExtractor:
         try:
             print(f"🔄 Converting {os.path.basename(avif_path)} to PNG...")
             
+            Image = _require("PIL.Image")
             with Image.open(avif_path) as img:
-                # Convert to RGB if necessary
-                if img.mode != 'RGB':
+                # PNG stores RGB, RGBA and L directly; only other modes need a converted copy
+                if img.mode not in ('RGB', 'RGBA', 'L'):
                     img = img.convert('RGB')
                 
-                # Save as PNG
-                img.save(png_path, 'PNG')
+                # Save as PNG (fast zlib level; optimize=True retries every level)
+                img.save(png_path, 'PNG', compress_level=3)
                 print(f"✅ Converted to: {os.path.basename(png_path)}")
                 return True
                 
@@ -291,13 +493,9 @@ class GPTFurnitureExtractor:
                     quality="low"
                 )
                 
-                # Get the generated image
-                image_base64 = result.data[0].b64_json
-                image_bytes = base64.b64decode(image_base64)
-                
-                # Save the image to file
+                # Save the generated image to file
                 with open(output_path, "wb") as f:
-                    f.write(image_bytes)
+                    f.write(binascii.a2b_base64(result.data[0].b64_json))
                 
                 print(f"✅ Image generated and saved to: {os.path.basename(output_path)}")
                 return output_path
@@ -311,17 +509,8 @@ class GPTFurnitureExtractor:
             print(f"❌ Error generating image with GPT-Image-1: {e}")
             return None
     
-    def detect_furniture_items_and_colors(self, image_path: str) -> Tuple[List[str], List[str]]:
-        """Use GPT-4 Vision to detect furniture items and their colors in the image."""
-        try:
-            print(f"🔍 Detecting furniture items and colors in: {os.path.basename(image_path)}")
-            
-            # Read and encode the image
-            with open(image_path, "rb") as image_file:
-                image_data = base64.b64encode(image_file.read()).decode('utf-8')
-            
-            # Create the detection prompt
-            detection_prompt = """
+    # Prompt sent with the designed room image to GPT-4 Vision
+    DETECTION_PROMPT = """
 Look at this image and identify which of these furniture types are present:
 - benches
 - chairs  
@@ -333,158 +522,274 @@ Look at this image and identify which of these furniture types are present:
 
 For each furniture item you detect, also identify its primary color/material.
 
-Respond with ONLY two lists in this exact format:
-Items: [item1, item2, item3]
-Colors: [color1, color2, color3]
-
-Where color1 corresponds to item1, color2 to item2, etc.
+Return "items" and "colors" as two lists of the same length, where colors[k] is the color of items[k].
 
-For example, if you see a gray sofa and a wooden table, respond:
-Items: [sofa, table]
-Colors: [gray, wooden]
+For example, if you see a gray sofa and a wooden table, return:
+{"items": ["sofa", "table"], "colors": ["gray", "wooden"]}
 
-If you see nothing, respond:
-Items: []
-Colors: []
+If you see nothing, return empty lists.
 """
+    
+    # Structured output schema: the model's reply is validated JSON matching this shape
+    DETECTION_SCHEMA = {
+        "type": "object",
+        "properties": {
+            "items": {"type": "array", "items": {"type": "string"}},
+            "colors": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": ["items", "colors"],
+        "additionalProperties": False
+    }
+    
+    DETECTION_MODEL = "gpt-4o-mini"
+    # detail="low" has the server work on at most 512x512, so larger uploads are wasted bytes
+    DETECTION_IMAGE_SIZE = 512
+    
+    def _detection_image_base64(self, image_path: str) -> str:
+        """Base64 PNG of the image, downscaled to the detection size when OpenCV is available."""
+        cv2 = _require("cv2") if OPENCV_AVAILABLE else None
+        if cv2 is not None:
+            img = cv2.imread(image_path, cv2.IMREAD_COLOR)
+            if img is not None:
+                height, width = img.shape[:2]
+                if max(height, width) > self.DETECTION_IMAGE_SIZE:
+                    scale = self.DETECTION_IMAGE_SIZE / max(height, width)
+                    img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+                ok, encoded = cv2.imencode('.png', img, [cv2.IMWRITE_PNG_COMPRESSION, 3])
+                if ok:
+                    return base64.b64encode(encoded).decode('ascii')
+        
+        return _encode_file_base64(image_path)
+    
+    def _detection_request_body(self, image_path: str) -> dict:
+        """Build the chat.completions payload for detecting furniture in an image."""
+        image_data = self._detection_image_base64(image_path)
+        
+        return {
+            "model": self.DETECTION_MODEL,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": self.DETECTION_PROMPT},
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:image/png;base64,{image_data}",
+                                "detail": "low"
+                            }
+                        }
+                    ]
+                }
+            ],
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": "furniture", "schema": self.DETECTION_SCHEMA, "strict": True}
+            },
+            "max_tokens": 100,
+            "temperature": 0.1
+        }
+    
+    def _parse_detection_response(self, response_text: str) -> Tuple[List[str], List[str]]:
+        """Parse the items/colors JSON returned by a detection request."""
+        print(f"📋 GPT-4 Vision detected: {response_text.strip()}")
+        
+        try:
+            data = json.loads(response_text)
+            items = [str(item).strip() for item in data['items']]
+            colors = [str(color).strip() for color in data['colors']]
+            
+            # Validate that items and colors match
+            if len(items) != len(colors):
+                print(f"⚠️ Mismatch: {len(items)} items but {len(colors)} colors")
+                # Pad with "unknown" if colors are missing, truncate if there are too many
+                colors = (colors + ["unknown"] * len(items))[:len(items)]
+            
+            print(f"✅ Detected furniture items: {items}")
+            print(f"✅ Detected colors: {colors}")
+            return items, colors
+            
+        except Exception as parse_error:
+            print(f"⚠️ Error parsing response: {parse_error}")
+            return [], []
+    
+    def detect_furniture_items_and_colors(self, image_path: str) -> Tuple[List[str], List[str]]:
+        """Use GPT-4 Vision to detect furniture items and their colors in the image."""
+        try:
+            print(f"🔍 Detecting furniture items and colors in: {os.path.basename(image_path)}")
             
             # Call GPT-4 Vision
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": detection_prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{image_data}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=200,
-                temperature=0.1
-            )
+            response = self.client.chat.completions.create(**self._detection_request_body(image_path))
             
             # Parse the response
-            response_text = response.choices[0].message.content.strip()
-            print(f"📋 GPT-4 Vision detected: {response_text}")
-            
-            # Extract items and colors from the response
-            items = []
-            colors = []
-            
-            try:
-                lines = response_text.split('\n')
-                for line in lines:
-                    line = line.strip()
-                    if line.startswith('Items:'):
-                        items_text = line.replace('Items:', '').strip()
-                        if items_text.startswith('[') and items_text.endswith(']'):
-                            items_content = items_text[1:-1]
-                            if items_content.strip():
-                                items = [item.strip() for item in items_content.split(',')]
-                    elif line.startswith('Colors:'):
-                        colors_text = line.replace('Colors:', '').strip()
-                        if colors_text.startswith('[') and colors_text.endswith(']'):
-                            colors_content = colors_text[1:-1]
-                            if colors_content.strip():
-                                colors = [color.strip() for color in colors_content.split(',')]
-                
-                # Validate that items and colors match
-                if len(items) != len(colors):
-                    print(f"⚠️ Mismatch: {len(items)} items but {len(colors)} colors")
-                    # Pad with "unknown" if colors are missing
-                    while len(colors) < len(items):
-                        colors.append("unknown")
-                    # Truncate if too many colors
-                    colors = colors[:len(items)]
-                
-                print(f"✅ Detected furniture items: {items}")
-                print(f"✅ Detected colors: {colors}")
-                return items, colors
-                
-            except Exception as parse_error:
-                print(f"⚠️ Error parsing response: {parse_error}")
-                return [], []
+            return self._parse_detection_response(response.choices[0].message.content)
                 
         except Exception as e:
             print(f"❌ Error detecting furniture items and colors: {e}")
             return [], []
     
     def save_detection_results_to_csv(self, query_number: int, items: List[str], colors: List[str], image_path: str) -> str:
-        """Save detection results to CSV file."""
+        """Queue detection results; they are written to the CSV by flush_detection_buffer."""
+        self._detection_buffer.append({
+            'query_number': query_number,
+            'timestamp': datetime.datetime.now().isoformat(),
+            'image_path': image_path,
+            'items': ','.join(items),
+            'colors': ','.join(colors)
+        })
+        print(f"📝 Queued detection results for query {query_number} ({len(self._detection_buffer)} pending)")
+        return self.DETECTION_CSV_PATH
+    
+    def flush_detection_buffer(self, parquet: bool = False) -> str:
+        """Append every queued detection row to the CSV in one write, optionally also as a Parquet part file."""
+        if not self._detection_buffer:
+            return ""
+        
         try:
-            csv_path = "generated_images/furniture_detection_results.csv"
+            csv_path = self.DETECTION_CSV_PATH
+            os.makedirs(os.path.dirname(csv_path), exist_ok=True)
             
             # Check if CSV file exists to determine if we need headers
             file_exists = os.path.exists(csv_path)
             
             with open(csv_path, 'a', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ['query_number', 'timestamp', 'image_path', 'items', 'colors']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+                writer = csv.DictWriter(csvfile, fieldnames=self.DETECTION_FIELDS)
                 
                 # Write header if file is new
                 if not file_exists:
                     writer.writeheader()
-                
-                # Write the data
-                writer.writerow({
-                    'query_number': query_number,
-                    'timestamp': datetime.datetime.now().isoformat(),
-                    'image_path': image_path,
-                    'items': ','.join(items),
-                    'colors': ','.join(colors)
-                })
+                writer.writerows(self._detection_buffer)
+            
+            if parquet:
+                self._write_detection_parquet(self._detection_buffer)
             
-            print(f"✅ Detection results saved to CSV: {csv_path}")
+            print(f"✅ Saved {len(self._detection_buffer)} detection results to CSV: {csv_path}")
+            self._detection_buffer = []
             return csv_path
             
         except Exception as e:
             print(f"❌ Error saving to CSV: {e}")
             return ""
     
+    def _write_detection_parquet(self, rows: List[dict]) -> str:
+        """Write detection rows as a new zstd Parquet part in the detection results dataset folder."""
+        if not PYARROW_AVAILABLE:
+            print("⚠️  pyarrow not available, skipping Parquet export. Install with: pip install pyarrow")
+            return ""
+        
+        try:
+            # Parquet files can't be appended to, so each flush adds one part file to the dataset
+            dataset_dir = os.path.splitext(self.DETECTION_CSV_PATH)[0]
+            os.makedirs(dataset_dir, exist_ok=True)
+            part_path = os.path.join(dataset_dir, f"part-{datetime.datetime.now():%Y%m%dT%H%M%S%f}.parquet")
+            
+            pa, pq = _require("pyarrow"), _require("pyarrow.parquet")
+            table = pa.table({field: [row[field] for row in rows] for field in self.DETECTION_FIELDS})
+            pq.write_table(table, part_path, compression='zstd')
+            
+            print(f"✅ Detection results saved to Parquet: {part_path}")
+            return part_path
+            
+        except Exception as e:
+            print(f"❌ Error saving detection results to Parquet: {e}")
+            return ""
+    
+    def _extraction_output_path(self, item_type: str, query_number: int) -> str:
+        """Path where the extracted image for an item is written."""
+        return f"querries/query_{query_number}/generated_images/generated_furniture/{item_type}_extracted.png"
+    
+    @staticmethod
+    def _extraction_prompt(item_type: str) -> str:
+        """Build the GPT-Image-1 prompt for extracting a single item."""
+        return f"Extract the {item_type} and put it in the center of the image and head on. Make all background around the {item_type} white."
+    
+    @classmethod
+    def _extraction_edit_args(cls, item_type: str) -> Dict[str, str]:
+        """images.edit arguments (besides the image) for a single-item extraction, shared by the sync and async paths."""
+        return {"model": "gpt-image-1", "prompt": cls._extraction_prompt(item_type), "quality": "low"}
+    
+    @staticmethod
+    def _grayscale_output_path(extracted_path: str) -> str:
+        """Grayscale twin of an extracted image, in the sibling generated_furniture_gray folder."""
+        folder, filename = os.path.split(extracted_path)
+        name, ext = os.path.splitext(filename)
+        return os.path.join(f"{folder}_gray", f"{name}_grayscale{ext}")
+    
+    def _write_grayscale(self, image_bytes: bytes, gray_path: str) -> bool:
+        """Decode encoded image bytes in memory and write their grayscale version."""
+        if not OPENCV_AVAILABLE:
+            print("❌ OpenCV not available for grayscale conversion")
+            return False
+        
+        cv2, np = _require("cv2"), _require("numpy")
+        img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            print(f"❌ Could not decode image for grayscale: {os.path.basename(gray_path)}")
+            return False
+        
+        os.makedirs(os.path.dirname(gray_path), exist_ok=True)
+        return cv2.imwrite(gray_path, cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+    
+    def _save_edit_result(self, response, output_path: str) -> bool:
+        """Write the image returned by an images.edit call, plus its grayscale version, to disk."""
+        # Ensure the directory exists
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        
+        if hasattr(response.data[0], 'b64_json') and response.data[0].b64_json:
+            # GPT-Image-1 returns base64 data
+            image_bytes = binascii.a2b_base64(response.data[0].b64_json)
+        elif hasattr(response.data[0], 'url') and response.data[0].url:
+            # DALL-E returns URL
+            download = _get_download_client().get(response.data[0].url)
+            download.raise_for_status()
+            image_bytes = download.content
+        else:
+            print(f"❌ No image data received from API")
+            return False
+        
+        # The returned PNG is written as-is; the grayscale copy comes from the same in-memory bytes
+        with open(output_path, "wb") as f:
+            f.write(image_bytes)
+        self._write_grayscale(image_bytes, self._grayscale_output_path(output_path))
+        return True
+    
     def extract_furniture_item(self, reference_image: str, item_type: str, query_number: int) -> Optional[str]:
         """Extract a specific furniture item using GPT-Image-1."""
         try:
             # Set output path for the new folder structure
-            output_path = f"querries/query_{query_number}/generated_images/generated_furniture/{item_type}_extracted.png"
+            output_path = self._extraction_output_path(item_type, query_number)
             
             print(f"🎨 Extracting {item_type} with GPT-Image-1...")
             
-            # Create item-specific prompt
-            prompt = f"Extract the {item_type} and put it in the center of the image and head on. Make all background around the {item_type} white."
-            
             # Call GPT-Image-1 with reference image
-            response = self.client.images.edit(
-                model="gpt-image-1",
-                image=open(reference_image, "rb"),
-                prompt=prompt,
-                quality="low"
-            )
+            with open(reference_image, "rb") as image_file:
+                response = self.client.images.edit(image=image_file, **self._extraction_edit_args(item_type))
             
-            # Ensure the directory exists
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            if not self._save_edit_result(response, output_path):
+                return None
             
-            # Save the result
-            if hasattr(response.data[0], 'b64_json') and response.data[0].b64_json:
-                # GPT-Image-1 returns base64 data
-                import base64
-                image_data = base64.b64decode(response.data[0].b64_json)
-                with open(output_path, "wb") as f:
-                    f.write(image_data)
-            elif hasattr(response.data[0], 'url') and response.data[0].url:
-                # DALL-E returns URL
-                image_url = response.data[0].url
-                import requests
-                response_img = requests.get(image_url)
-                with open(output_path, "wb") as f:
-                    f.write(response_img.content)
-            else:
-                print(f"❌ No image data received from API")
+            print(f"✅ {item_type.title()} extraction completed: {os.path.basename(output_path)}")
+            return output_path
+            
+        except Exception as e:
+            print(f"❌ Error extracting {item_type}: {e}")
+            return None
+    
+    async def aextract_furniture_item(self, aclient: "AsyncOpenAI", reference_image: str, item_type: str,
+                                      query_number: int, semaphore: asyncio.Semaphore) -> Optional[str]:
+        """Async variant of extract_furniture_item, bounded by a shared semaphore."""
+        try:
+            output_path = self._extraction_output_path(item_type, query_number)
+            
+            async with semaphore:
+                if self._edit_limiter:
+                    await self._edit_limiter.acquire()
+                print(f"🎨 Extracting {item_type} with GPT-Image-1...")
+                with open(reference_image, "rb") as image_file:
+                    response = await aclient.images.edit(image=image_file, **self._extraction_edit_args(item_type))
+            
+            # Decode and write off the event loop so other edits keep flowing
+            if not await asyncio.to_thread(self._save_edit_result, response, output_path):
                 return None
             
             print(f"✅ {item_type.title()} extraction completed: {os.path.basename(output_path)}")
@@ -494,13 +799,107 @@ Colors: []
             print(f"❌ Error extracting {item_type}: {e}")
             return None
     
+    async def _aextract_all(self, reference_image: str, items: List[str], query_number: int) -> List[Optional[str]]:
+        """Run one extraction per item concurrently, at most max_concurrency at a time."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        # Async connections are tied to the event loop, so each asyncio.run gets its own pool
+        openai, httpx = _require("openai"), _require("httpx")
+        http_client = httpx.AsyncClient(**_http_pool_options())
+        async with openai.AsyncOpenAI(api_key=self.client.api_key, http_client=http_client) as aclient:
+            tasks = [self.aextract_furniture_item(aclient, reference_image, item, query_number, semaphore)
+                     for item in items]
+            return await asyncio.gather(*tasks)
+    
+    def extract_furniture_items(self, reference_image: str, items: List[str], query_number: int) -> List[str]:
+        """Extract several furniture items in parallel; returns the paths that succeeded."""
+        # Repeated item types share one output file, so extract each type once
+        items = list(dict.fromkeys(items))
+        if not self.client:
+            print("❌ OpenAI client not available")
+            return []
+        if self.grid_extraction and len(items) > 1:
+            return self.extract_furniture_grid(reference_image, items, query_number)
+        
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            results = asyncio.run(self._aextract_all(reference_image, items, query_number))
+        else:
+            # asyncio.run can't be nested inside a running event loop (e.g. a notebook), so fall
+            # back to the sync client on a thread pool; the per-minute edit cap only applies to the async path
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                results = list(executor.map(
+                    lambda item: self.extract_furniture_item(reference_image, item, query_number), items
+                ))
+        return [path for path in results if path]
+    
+    @staticmethod
+    def _grid_shape(count: int) -> Tuple[int, int]:
+        """(rows, cols) of the smallest near-square grid holding `count` cells."""
+        cols = math.ceil(math.sqrt(count))
+        return math.ceil(count / cols), cols
+    
+    def extract_furniture_grid(self, reference_image: str, items: List[str], query_number: int) -> List[str]:
+        """Extract several items with a single GPT-Image-1 edit laid out as a grid, then split it into cells."""
+        if not OPENCV_AVAILABLE:
+            print("❌ OpenCV not available for splitting the extraction grid")
+            return []
+        
+        cv2, np = _require("cv2"), _require("numpy")
+        try:
+            rows, cols = self._grid_shape(len(items))
+            cells = "; ".join(
+                f"row {k // cols + 1}, column {k % cols + 1}: the {item}" for k, item in enumerate(items)
+            )
+            prompt = (
+                f"Produce a 1024x1024 image divided into an evenly spaced grid of {rows} rows and {cols} columns. "
+                f"Place each furniture item from the reference image, head on, centered in its own cell: {cells}. "
+                f"Leave any remaining cells empty. Make all background white."
+            )
+            
+            print(f"🎨 Extracting {len(items)} items with one GPT-Image-1 grid edit ({rows}x{cols})...")
+            with open(reference_image, "rb") as image_file:
+                response = self.client.images.edit(
+                    model="gpt-image-1",
+                    image=image_file,
+                    prompt=prompt,
+                    size="1024x1024",
+                    quality="low"
+                )
+            
+            if not (hasattr(response.data[0], 'b64_json') and response.data[0].b64_json):
+                print(f"❌ No image data received from API")
+                return []
+            
+            grid = cv2.imdecode(np.frombuffer(binascii.a2b_base64(response.data[0].b64_json), np.uint8), cv2.IMREAD_COLOR)
+            if grid is None:
+                print("❌ Could not decode the extraction grid")
+                return []
+            
+            # Slice cells as array views and write each one under the per-item filename
+            cell_h, cell_w = grid.shape[0] // rows, grid.shape[1] // cols
+            extracted_images = []
+            for k, item in enumerate(items):
+                row, col = divmod(k, cols)
+                cell = grid[row * cell_h:(row + 1) * cell_h, col * cell_w:(col + 1) * cell_w]
+                
+                output_path = self._extraction_output_path(item, query_number)
+                gray_path = self._grayscale_output_path(output_path)
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                os.makedirs(os.path.dirname(gray_path), exist_ok=True)
+                if cv2.imwrite(output_path, cell) and cv2.imwrite(gray_path, cv2.cvtColor(cell, cv2.COLOR_BGR2GRAY)):
+                    extracted_images.append(output_path)
+                    print(f"✅ {item.title()} extraction completed: {os.path.basename(output_path)}")
+            
+            return extracted_images
+            
+        except Exception as e:
+            print(f"❌ Error extracting furniture grid: {e}")
+            return []
+    
     def convert_to_png_if_needed(self, image_path: str) -> Optional[str]:
         """Convert image to PNG format if needed and resize if too large."""
         try:
-            if not PIL_AVAILABLE:
-                print("❌ PIL not available for image conversion")
-                return None
-            
             # Check if already PNG
             if image_path.lower().endswith('.png'):
                 # Check file size
@@ -510,28 +909,59 @@ Colors: []
                 else:
                     print(f"⚠️ PNG file is {file_size / (1024*1024):.1f}MB, resizing...")
             
-            # Convert to PNG and resize if needed
-            img = Image.open(image_path)
+            # Reuse an earlier conversion of identical source bytes (e.g. a retried query)
+            source_hash = _file_sha256(image_path)
+            cache_path = os.path.join(self.PNG_CACHE_DIR, f"{source_hash}.png")
+            png_path = image_path.rsplit('.', 1)[0] + '.png'
+            if os.path.exists(cache_path):
+                # Materialize the PNG beside the source, where a fresh conversion would have put it
+                shutil.copyfile(cache_path, png_path)
+                print(f"✅ Reused cached PNG conversion: {os.path.basename(png_path)}")
+                return png_path
             
-            # Resize if image is too large (keep aspect ratio)
             max_size = 1024  # Maximum dimension
-            if img.width > max_size or img.height > max_size:
-                img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-                print(f"✅ Resized image to {img.width}x{img.height}")
             
-            png_path = image_path.rsplit('.', 1)[0] + '.png'
-            img.save(png_path, 'PNG', optimize=True)
+            # Decode, resize and re-encode in one OpenCV pass; PIL covers formats OpenCV can't read (e.g. AVIF)
+            if not (OPENCV_AVAILABLE and self._cv_pipeline(image_path, png_path, max_dim=max_size)):
+                if not PIL_AVAILABLE:
+                    print("❌ PIL not available for image conversion")
+                    return None
+                
+                Image = _require("PIL.Image")
+                img = Image.open(image_path)
+                
+                # Resize if image is too large (keep aspect ratio)
+                if img.width > max_size or img.height > max_size:
+                    img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+                    print(f"✅ Resized image to {img.width}x{img.height}")
+                
+                img.save(png_path, 'PNG', compress_level=3)
             
             # Check final size
             final_size = os.path.getsize(png_path)
             print(f"✅ Converted to PNG: {os.path.basename(png_path)} ({final_size / (1024*1024):.1f}MB)")
             
+            self._cache_png_conversion(png_path, cache_path)
             return png_path
             
         except Exception as e:
             print(f"❌ Error converting image to PNG: {e}")
             return None
     
+    def _cache_png_conversion(self, png_path: str, cache_path: str):
+        """Record a converted PNG in the conversion cache.
+        
+        The entry is an independent copy: png_path may later be rewritten in place by another conversion.
+        """
+        try:
+            os.makedirs(self.PNG_CACHE_DIR, exist_ok=True)
+            # Copy to a temp file and rename, so readers never see a partial entry
+            temp_path = f"{cache_path}.{os.getpid()}.tmp"
+            shutil.copyfile(png_path, temp_path)
+            os.replace(temp_path, cache_path)
+        except Exception as e:
+            print(f"⚠️ Could not cache PNG conversion: {e}")
+    
     def process_all_furniture(self, reference_image: str, query_number: int) -> Tuple[List[str], List[str], List[str]]:
         """Process all furniture items detected in the image."""
         try:
@@ -546,6 +976,16 @@ Colors: []
             # Detect furniture items and colors using the PNG image
             items, colors = self.detect_furniture_items_and_colors(png_image_path)
             
+            return self.extract_detected_furniture(reference_image, png_image_path, query_number, items, colors)
+            
+        except Exception as e:
+            print(f"❌ Error processing all furniture: {e}")
+            return [], [], []
+    
+    def extract_detected_furniture(self, reference_image: str, png_image_path: str, query_number: int,
+                                   items: List[str], colors: List[str]) -> Tuple[List[str], List[str], List[str]]:
+        """Save detections, extract every detected item and create grayscale versions."""
+        try:
             if not items:
                 print("❌ No furniture items detected")
                 return [], [], []
@@ -553,45 +993,209 @@ Colors: []
             # Save detection results to CSV
             csv_path = self.save_detection_results_to_csv(query_number, items, colors, reference_image)
             
-            # Extract each detected item using the PNG image
-            extracted_images = []
+            # Extract all detected items concurrently using the PNG image
             for i, item in enumerate(items):
                 color = colors[i] if i < len(colors) else "unknown"
-                print(f"\n🔄 Processing {item} (color: {color})...")
-                extracted_path = self.extract_furniture_item(png_image_path, item, query_number)
-                if extracted_path:
-                    extracted_images.append(extracted_path)
-            
-            # Create grayscale versions
-            print(f"\n🔄 Creating grayscale versions...")
-            grayscale_images = self.process_generated_images_to_grayscale(query_number)
+                print(f"🔄 Queued {item} (color: {color})")
+            print(f"\n🔄 Extracting {len(items)} items (up to {self.max_concurrency} at a time)...")
+            # Grayscale versions are written alongside each extraction
+            extracted_images = self.extract_furniture_items(png_image_path, items, query_number)
             
             return extracted_images, items, colors
             
         except Exception as e:
             print(f"❌ Error processing all furniture: {e}")
             return [], [], []
-
-def main():
-    """Main function to automatically process queries that need extraction."""
-    print("🎨 GPT Furniture Extractor - Master Query Log Integration")
-    print("=" * 60)
     
-    # Initialize
-    extractor = GPTFurnitureExtractor()
+    def build_batch_jsonl(self, requests: List[Tuple[str, str]], jsonl_path: str) -> str:
+        """Write one Batch API detection request per (custom_id, png_path) pair."""
+        try:
+            os.makedirs(os.path.dirname(jsonl_path) or ".", exist_ok=True)
+            with open(jsonl_path, 'w', encoding='utf-8') as f:
+                for custom_id, png_path in requests:
+                    f.write(json.dumps({
+                        "custom_id": custom_id,
+                        "method": "POST",
+                        "url": "/v1/chat/completions",
+                        "body": self._detection_request_body(png_path)
+                    }) + "\n")
+            
+            print(f"✅ Batch input written: {jsonl_path} ({len(requests)} requests)")
+            return jsonl_path
+            
+        except Exception as e:
+            print(f"❌ Error building batch input: {e}")
+            return ""
+    
+    def submit_batch(self, jsonl_path: str) -> Optional[str]:
+        """Upload a batch input file and start a Batch API job; returns the batch id."""
+        try:
+            with open(jsonl_path, "rb") as f:
+                batch_file = self.client.files.create(file=f, purpose="batch")
+            
+            batch = self.client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+            print(f"📤 Submitted batch {batch.id}")
+            return batch.id
+            
+        except Exception as e:
+            print(f"❌ Error submitting batch: {e}")
+            return None
+    
+    def wait_for_batch(self, batch_id: str, initial_delay: float = 5.0, max_delay: float = 300.0) -> dict:
+        """Poll a batch with exponential backoff and return {custom_id: response text}."""
+        try:
+            delay = initial_delay
+            while True:
+                batch = self.client.batches.retrieve(batch_id)
+                if batch.status == "completed":
+                    break
+                if batch.status in ("failed", "expired", "cancelled"):
+                    print(f"❌ Batch {batch_id} ended with status '{batch.status}'")
+                    return {}
+                
+                print(f"⏳ Batch {batch_id} is {batch.status}, checking again in {delay:.0f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, max_delay)
+            
+            if not batch.output_file_id:
+                print(f"❌ Batch {batch_id} produced no output")
+                return {}
+            
+            # Map each output line back to the request that produced it
+            results = {}
+            for line in self.client.files.content(batch.output_file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                response = row.get("response") or {}
+                if response.get("status_code") != 200:
+                    print(f"⚠️ Batch request {row.get('custom_id')} failed: {row.get('error')}")
+                    continue
+                results[row["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+            
+            print(f"✅ Batch {batch_id} completed with {len(results)} responses")
+            return results
+            
+        except Exception as e:
+            print(f"❌ Error waiting for batch: {e}")
+            return {}
     
+    def process_queries_batch(self, query_numbers: List[int]) -> dict:
+        """Detect furniture for several queries in one Batch API job, then extract each query's items."""
+        try:
+            # Prepare one PNG per query and queue its detection request
+            prepared = {}
+            for query_number in query_numbers:
+                designed_room_image = self.find_designed_room_image(query_number)
+                if designed_room_image is None:
+                    continue
+                png_image_path = self.convert_to_png_if_needed(designed_room_image)
+                if png_image_path:
+                    prepared[f"query_{query_number}_detect"] = (query_number, designed_room_image, png_image_path)
+            
+            if not prepared:
+                print("❌ No query images to submit")
+                return {}
+            
+            jsonl_path = self.build_batch_jsonl(
+                [(custom_id, png_path) for custom_id, (_, _, png_path) in prepared.items()],
+                "generated_images/detection_batch_input.jsonl"
+            )
+            batch_id = self.submit_batch(jsonl_path) if jsonl_path else None
+            if batch_id is None:
+                return {}
+            
+            responses = self.wait_for_batch(batch_id)
+            
+            # Dispatch each detection to the extraction step by custom_id
+            results = {}
+            for custom_id, (query_number, designed_room_image, png_image_path) in prepared.items():
+                if custom_id not in responses:
+                    print(f"❌ No detection result for query {query_number}")
+                    continue
+                items, colors = self._parse_detection_response(responses[custom_id])
+                results[query_number] = self.extract_detected_furniture(
+                    designed_room_image, png_image_path, query_number, items, colors
+                )
+            return results
+            
+        except Exception as e:
+            print(f"❌ Error processing queries in batch: {e}")
+            return {}
+
+def _process_one(query_number: int, max_concurrency: int, edits_per_minute: Optional[float],
+                 grid_extraction: bool = False) -> Tuple[int, List[str], List[str], List[dict]]:
+    """Worker-process body: extract one query and hand its detection rows back to the parent."""
+    extractor = GPTFurnitureExtractor(max_concurrency=max_concurrency, edits_per_minute=edits_per_minute,
+                                      grid_extraction=grid_extraction)
     if not extractor.is_available():
-        print("❌ GPT furniture extractor not available. Please check API key.")
-        return
+        return query_number, [], [], []
     
-    if not PIL_AVAILABLE:
-        print("❌ PIL not available. Please install Pillow.")
+    designed_room_image = extractor.find_designed_room_image(query_number)
+    if designed_room_image is None:
+        return query_number, [], [], []
+    
+    extracted_images, detected_items, _ = extractor.process_all_furniture(designed_room_image, query_number)
+    return query_number, extracted_images, detected_items, extractor._detection_buffer
+
+def run_parallel_mode(extractor: GPTFurnitureExtractor, workers: int, edits_per_minute: Optional[float] = None):
+    """Extract every pending query, one worker process per query, then record all statuses in one write."""
+    pending = extractor.get_pending_queries()
+    if not pending:
+        print("✅ No queries pending extraction")
         return
     
-    if not OPENCV_AVAILABLE:
-        print("❌ OpenCV not available. Please install opencv-python.")
+    workers = max(1, min(workers, len(pending)))
+    # Every worker gets an equal share of the overall edit rate limit
+    per_worker_rate = edits_per_minute / workers if edits_per_minute else None
+    print(f"🚀 Extracting {len(pending)} pending queries with {workers} worker processes")
+    
+    statuses = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_process_one, q, extractor.max_concurrency, per_worker_rate,
+                                   extractor.grid_extraction): q for q in pending}
+        for future in as_completed(futures):
+            query_number = futures[future]
+            try:
+                _, extracted_images, detected_items, detection_rows = future.result()
+            except Exception as e:
+                print(f"❌ Worker failed for query {query_number}: {e}")
+                extracted_images, detected_items, detection_rows = [], [], []
+            
+            extractor._detection_buffer.extend(detection_rows)
+            if extracted_images:
+                statuses[query_number] = "yes"
+                print(f"✅ Query {query_number}: extracted {len(extracted_images)} of {len(detected_items)} items")
+            else:
+                statuses[query_number] = "no"
+                print(f"❌ Failed to extract furniture items for query {query_number}")
+    
+    extractor.update_extraction_statuses(statuses)
+
+def run_batch_mode(extractor: GPTFurnitureExtractor):
+    """Detect furniture for every pending query through one Batch API job."""
+    pending = extractor.get_pending_queries()
+    if not pending:
+        print("✅ No queries pending extraction")
         return
     
+    print(f"📦 Submitting detection for {len(pending)} pending queries as one batch")
+    results = extractor.process_queries_batch(pending)
+    
+    for query_number in pending:
+        extracted_images, detected_items, _ = results.get(query_number, ([], [], []))
+        if extracted_images:
+            extractor.update_extraction_status(query_number, "yes")
+            print(f"✅ Query {query_number}: extracted {len(extracted_images)} of {len(detected_items)} items")
+        else:
+            print(f"❌ Failed to extract furniture items for query {query_number}")
+
+def run_single_query(extractor: GPTFurnitureExtractor):
+    """Extract furniture for the latest query pending extraction."""
     # Check master query log for queries that need extraction
     query_number = extractor.check_master_query_log()
     
@@ -629,5 +1233,63 @@ def main():
         print(f"❌ Failed to extract furniture items for query {query_number}")
         extractor.update_extraction_status(query_number, "no")
 
+def main():
+    """Main function to automatically process queries that need extraction."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Extract furniture from designed room images for pending queries')
+    parser.add_argument('--batch', action='store_true',
+                       help='Detect furniture for all pending queries through the OpenAI Batch API (cheaper, completes asynchronously)')
+    parser.add_argument('--workers', type=int, default=0,
+                       help='Extract all pending queries in this many worker processes (default: only the latest query)')
+    parser.add_argument('--edits-per-minute', type=float, default=None,
+                       help='Cap on GPT-Image-1 edit requests started per minute, shared across workers')
+    parser.add_argument('--grid', action='store_true',
+                       help='Extract all items of a query with one GPT-Image-1 edit laid out as a grid (fewer calls, less control per item)')
+    parser.add_argument('--parquet', action='store_true',
+                       help='Also write detection results as a Parquet part file next to the CSV')
+    args = parser.parse_args()
+    
+    print("🎨 GPT Furniture Extractor - Master Query Log Integration")
+    print("=" * 60)
+    
+    # Initialize without the OpenAI client so an idle poll never imports openai
+    extractor = GPTFurnitureExtractor(edits_per_minute=args.edits_per_minute, grid_extraction=args.grid,
+                                      connect=False)
+    
+    if not extractor.get_pending_queries():
+        print("✅ No queries pending extraction")
+        return
+    
+    extractor._init_openai()
+    if not extractor.is_available():
+        print("❌ GPT furniture extractor not available. Please check API key.")
+        return
+    
+    if not PIL_AVAILABLE:
+        print("❌ PIL not available. Please install Pillow.")
+        return
+    
+    pil_simd_version = _pil_simd_version()
+    if pil_simd_version:
+        print(f"⚡ Using Pillow-SIMD {pil_simd_version} for image resizing")
+    else:
+        print("ℹ️ Using stock Pillow; install pillow-simd for faster resizing")
+    
+    if not OPENCV_AVAILABLE:
+        print("❌ OpenCV not available. Please install opencv-python.")
+        return
+    
+    try:
+        if args.batch:
+            run_batch_mode(extractor)
+        elif args.workers > 0:
+            run_parallel_mode(extractor, args.workers, args.edits_per_minute)
+        else:
+            run_single_query(extractor)
+    finally:
+        # Detection rows are buffered during the run and written once here
+        extractor.flush_detection_buffer(parquet=args.parquet)
+
 if __name__ == "__main__":
     main()
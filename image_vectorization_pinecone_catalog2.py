@@ -6,9 +6,15 @@ Creates Pinecone database with image embeddings using OpenAI's embedding API
 
 import os
 import base64
+import hashlib
+import io
 import json
+import random
+import threading
 import time
-from typing import List, Dict, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Dict, Optional, Tuple
 import pandas as pd
 from config import Config
 
@@ -27,6 +33,13 @@ except ImportError:
     PINECONE_AVAILABLE = False
     print("❌ Pinecone library not available. Install with: pip install pinecone")
 
+# gRPC transport for faster upserts (optional: pip install "pinecone[grpc]")
+try:
+    from pinecone.grpc import PineconeGRPC
+    PINECONE_GRPC_AVAILABLE = True
+except ImportError:
+    PINECONE_GRPC_AVAILABLE = False
+
 try:
     from PIL import Image
     PIL_AVAILABLE = True
@@ -34,17 +47,119 @@ except ImportError:
     PIL_AVAILABLE = False
     print("❌ PIL not available. Install with: pip install Pillow")
 
+class _RateLimiter:
+    """Lets at most `per_minute` requests start in any 60-second window, across threads.
+    
+    A rate-limit error halves the allowance (once, however many arrive together) until a minute
+    passes without another one.
+    """
+    
+    WINDOW_SECONDS = 60.0
+    
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self._limit = per_minute
+        self._throttled_until = 0.0
+        self._starts = deque()
+        self._condition = threading.Condition()
+    
+    def acquire(self):
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if self._limit < self.per_minute and now >= self._throttled_until:
+                    self._limit = self.per_minute
+                
+                # Forget requests that started more than a window ago
+                while self._starts and now - self._starts[0] >= self.WINDOW_SECONDS:
+                    self._starts.popleft()
+                
+                if len(self._starts) < self._limit:
+                    self._starts.append(now)
+                    return
+                self._condition.wait(self._starts[0] + self.WINDOW_SECONDS - now)
+    
+    def throttle(self):
+        with self._condition:
+            now = time.monotonic()
+            # Halve once per throttle window; a burst of 429s from concurrent workers only extends it.
+            # Once a quiet window has passed the allowance is back to full, so halve from there
+            if now >= self._throttled_until:
+                self._limit = max(1, self.per_minute // 2)
+            self._throttled_until = now + self.WINDOW_SECONDS
+
 class ImageVectorizationPinecone:
     """Image vectorization and Pinecone database management for Interior Define Catalog 2"""
     
-    def __init__(self, config: Config = None):
-        """Initialize the image vectorization system."""
+    # Concurrent embedding requests per batch (the OpenAI client is thread-safe)
+    MAX_EMBEDDING_WORKERS = 16
+    # Images per embeddings request, and a cap on the request's base64 payload
+    EMBEDDING_BATCH_SIZE = 32
+    MAX_EMBEDDING_REQUEST_BYTES = 16 * 1024 * 1024
+    # Embeddings requests started per minute, kept under the account's RPM limit
+    EMBEDDING_REQUESTS_PER_MINUTE = 2500
+    # Retries for an embedding request that hits the OpenAI rate limit
+    MAX_RATE_LIMIT_RETRIES = 5
+    # Connection pool size for the HTTP Pinecone index
+    PINECONE_POOL_THREADS = 30
+    # Parallel Pinecone upserts, and how many batches may be queued or in flight at once
+    MAX_UPSERT_WORKERS = 8
+    MAX_INFLIGHT_UPSERTS = 4
+    # Catalog CSV columns carried into each item
+    CATALOG_COLUMNS = ['catalog_number', 'item_name', 'item_type', 'price', 'color', 'image_url', 'link']
+    # Image embedding model, and where its embeddings are cached by image content hash
+    IMAGE_EMBEDDING_MODEL = "clip-vit-base-patch32"
+    EMBEDDING_CACHE_DIR = os.path.join(".cache", "openai_embeddings")
+    # Longest side images are downscaled to before upload, and where the resized JPEGs are kept
+    EMBEDDING_IMAGE_SIZE = 512
+    RESIZED_IMAGE_CACHE_DIR = os.path.join(".cache", "resized_images")
+    # Catalog item types and the image folders they are stored in
+    CATEGORY_FOLDERS = {
+        'sofa': 'sofas',
+        'sofas': 'sofas',
+        'chair': 'chairs',
+        'chairs': 'chairs',
+        'table': 'tables',
+        'tables': 'tables',
+        'bench': 'benches',
+        'benches': 'benches',
+        'nightstand': 'nightstands',
+        'nightstands': 'nightstands',
+        'lighting': 'lighting',
+        'lamp': 'lighting',
+        'rug': 'rugs',
+        'rugs': 'rugs'
+    }
+    # Leading bytes of the image formats in the catalog folders
+    IMAGE_MAGIC_TYPES = [
+        (b'\x89PNG', 'image/png'),
+        (b'\xff\xd8\xff', 'image/jpeg'),
+        (b'GIF8', 'image/gif'),
+        (b'RIFF', 'image/webp'),
+    ]
+    
+    def __init__(self, config: Config = None, max_workers: int = MAX_EMBEDDING_WORKERS, use_cache: bool = True):
+        """Initialize the image vectorization system.
+        
+        use_cache reuses embeddings stored on disk for images whose contents have not changed.
+        """
         if config is None:
             config = Config()
         
         self.config = config
         self.catalog_path = "InteriorDefine_catalog_2/INTERIOR_DEFINE_MASTER_CATALOG.csv"
         self.base_image_dir = "InteriorDefine_catalog_2"
+        self.max_workers = max(1, max_workers)
+        self.use_cache = use_cache
+        self._rate_limiter = _RateLimiter(self.EMBEDDING_REQUESTS_PER_MINUTE)
+        # Embeddings produced or loaded during the current upsert, keyed by image SHA-1
+        self._run_embeddings: Dict[str, List[float]] = {}
+        # Image files per category folder, filled in as folders are first searched
+        self._category_image_index: Dict[str, Optional[Dict[str, str]]] = {}
+        # Embeddings of downscaled uploads differ from full-size ones, so keep them apart
+        self.embedding_cache_dir = os.path.join(self.EMBEDDING_CACHE_DIR,
+                                                f"{self.IMAGE_EMBEDDING_MODEL}-{self.EMBEDDING_IMAGE_SIZE}px")
+        self.client = None
         self.pinecone_client = None
         self.index = None
         
@@ -85,8 +200,11 @@ class ImageVectorizationPinecone:
                 print("❌ Pinecone API key not found")
                 return
             
-            # Initialize Pinecone with new API
-            self.pinecone_client = Pinecone(api_key=pinecone_key)
+            # Initialize Pinecone with new API, over gRPC when the extra is installed
+            if PINECONE_GRPC_AVAILABLE:
+                self.pinecone_client = PineconeGRPC(api_key=pinecone_key)
+            else:
+                self.pinecone_client = Pinecone(api_key=pinecone_key)
             
             # Create or connect to Interior Define catalog 2 index
             index_name = "interior-define-images-catalog-2"
@@ -106,9 +224,13 @@ class ImageVectorizationPinecone:
             else:
                 print(f"✅ Using existing Pinecone index: {index_name}")
             
-            # Connect to the index
-            self.index = self.pinecone_client.Index(index_name)
-            print(f"✅ Pinecone client initialized successfully - Index: {index_name}")
+            # Connect to the index once; this handle is reused for every batch
+            if PINECONE_GRPC_AVAILABLE:
+                self.index = self.pinecone_client.Index(index_name)
+            else:
+                self.index = self.pinecone_client.Index(index_name, pool_threads=self.PINECONE_POOL_THREADS)
+            transport = "gRPC" if PINECONE_GRPC_AVAILABLE else "HTTP"
+            print(f"✅ Pinecone client initialized successfully - Index: {index_name} ({transport})")
             
         except Exception as e:
             print(f"❌ Pinecone initialization failed: {e}")
@@ -132,20 +254,13 @@ class ImageVectorizationPinecone:
             print(f"📁 Loading catalog data from: {self.catalog_path}")
             
             # Use pandas with proper CSV parsing to handle quoted fields with commas
-            df = pd.read_csv(self.catalog_path, quotechar='"', skipinitialspace=True)
-            items = []
-            
-            for _, row in df.iterrows():
-                # Clean up any NaN values and convert to strings
-                items.append({
-                    'catalog_number': str(row['catalog_number']) if pd.notna(row['catalog_number']) else '',
-                    'item_name': str(row['item_name']) if pd.notna(row['item_name']) else '',
-                    'item_type': str(row['item_type']) if pd.notna(row['item_type']) else '',
-                    'price': str(row['price']) if pd.notna(row['price']) else '',
-                    'color': str(row['color']) if pd.notna(row['color']) else 'Standard finish',
-                    'image_url': str(row['image_url']) if pd.notna(row['image_url']) else '',
-                    'link': str(row['link']) if pd.notna(row['link']) else ''
-                })
+            # Only parse the columns items carry
+            df = pd.read_csv(self.catalog_path, quotechar='"', skipinitialspace=True,
+                             usecols=self.CATALOG_COLUMNS)
+            
+            # Clean up NaN values and convert to strings column-wise rather than per row
+            df = df[self.CATALOG_COLUMNS].fillna({'color': 'Standard finish'}).fillna('').astype(str)
+            items = df.to_dict('records')
             
             print(f"✅ Loaded {len(items)} items from catalog")
             return items
@@ -166,46 +281,29 @@ class ImageVectorizationPinecone:
                 return image_url
             
             # Try to find image in the appropriate category folder
-            category_folders = {
-                'sofa': 'sofas',
-                'sofas': 'sofas',
-                'chair': 'chairs',
-                'chairs': 'chairs',
-                'table': 'tables',
-                'tables': 'tables',
-                'bench': 'benches',
-                'benches': 'benches',
-                'nightstand': 'nightstands',
-                'nightstands': 'nightstands',
-                'lighting': 'lighting',
-                'lamp': 'lighting',
-                'rug': 'rugs',
-                'rugs': 'rugs'
-            }
-            
-            category_folder = category_folders.get(item_type.lower(), item_type.lower())
+            category_folder = self.CATEGORY_FOLDERS.get(item_type.lower(), item_type.lower())
             category_dir = os.path.join(self.base_image_dir, category_folder)
             
-            if not os.path.exists(category_dir):
+            category_images = self._category_images(category_dir)
+            if category_images is None:
                 return None
             
             # First, try to match the exact filename from image_url (with different extensions)
             if image_url:
                 base_filename = os.path.splitext(os.path.basename(image_url))[0]
                 for ext in ['.png', '.jpg', '.jpeg']:
-                    potential_path = os.path.join(category_dir, base_filename + ext)
-                    if os.path.exists(potential_path):
-                        return potential_path
+                    if base_filename + ext in category_images:
+                        return os.path.join(category_dir, base_filename + ext)
             
             # If that doesn't work, look for image files that might match this item
-            for filename in os.listdir(category_dir):
-                if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    # Check if filename contains catalog number or item name
-                    item_name_clean = item.get('item_name', '').replace(' ', '_').replace('·', '').replace(',', '').replace('(', '').replace(')', '')
-                    if (catalog_number in filename or 
-                        item_name_clean.lower() in filename.lower() or
-                        item_type.lower() in filename.lower()):
-                        return os.path.join(category_dir, filename)
+            item_name_clean = item.get('item_name', '').replace(' ', '_').replace('·', '').replace(',', '').replace('(', '').replace(')', '').lower()
+            item_type_lower = item_type.lower()
+            for filename, filename_lower in category_images.items():
+                # Check if filename contains catalog number or item name
+                if (catalog_number in filename or 
+                    item_name_clean in filename_lower or
+                    item_type_lower in filename_lower):
+                    return os.path.join(category_dir, filename)
             
             return None
             
@@ -213,51 +311,322 @@ class ImageVectorizationPinecone:
             print(f"❌ Error finding image path for {item.get('catalog_number', 'unknown')}: {e}")
             return None
     
-    def encode_image_to_base64(self, image_path: str) -> Optional[str]:
-        """Encode image to base64 string."""
+    def _category_images(self, category_dir: str) -> Optional[Dict[str, str]]:
+        """Return a category folder's image files (name -> lowercased name), listing the folder only once.
+        
+        None means the folder does not exist.
+        """
+        if category_dir not in self._category_image_index:
+            if os.path.isdir(category_dir):
+                # Dicts keep insertion order, so matching still follows directory order
+                images = {entry.name: entry.name.lower() for entry in os.scandir(category_dir)
+                          if entry.name.lower().endswith(('.jpg', '.jpeg', '.png'))}
+            else:
+                images = None
+            self._category_image_index[category_dir] = images
+        return self._category_image_index[category_dir]
+    
+    def _read_image(self, image_path: str) -> Optional[bytes]:
+        """Read an image file's bytes, or None if it cannot be read."""
         try:
             with open(image_path, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
+                return image_file.read()
         except Exception as e:
-            print(f"❌ Error encoding image {image_path}: {e}")
+            print(f"❌ Error reading image {image_path}: {e}")
             return None
     
+    def _image_data_url(self, image_bytes: bytes) -> str:
+        """Build a base64 data URL for image bytes, taking the MIME type from the file's magic header."""
+        mime_type = 'image/png'
+        for magic, magic_type in self.IMAGE_MAGIC_TYPES:
+            if image_bytes.startswith(magic):
+                mime_type = magic_type
+                break
+        return f"data:{mime_type};base64," + base64.b64encode(image_bytes).decode('ascii')
+    
+    def _prepare_image(self, image_bytes: bytes, image_hash: str) -> bytes:
+        """Downscale an image to EMBEDDING_IMAGE_SIZE as a JPEG, reusing the resized copy from earlier runs.
+        
+        Falls back to the original bytes if the image cannot be resized.
+        """
+        resized_path = os.path.join(self.RESIZED_IMAGE_CACHE_DIR, f"{image_hash}_{self.EMBEDDING_IMAGE_SIZE}.jpg")
+        if os.path.exists(resized_path):
+            resized_bytes = self._read_image(resized_path)
+            if resized_bytes is not None:
+                return resized_bytes
+        
+        if not PIL_AVAILABLE:
+            return image_bytes
+        
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as img:
+                if max(img.size) <= self.EMBEDDING_IMAGE_SIZE and img.format == 'JPEG':
+                    return image_bytes
+                
+                img.thumbnail((self.EMBEDDING_IMAGE_SIZE, self.EMBEDDING_IMAGE_SIZE), Image.LANCZOS)
+                if img.mode in ('RGBA', 'LA', 'P'):
+                    # Flatten transparent product shots onto white rather than black
+                    img = img.convert('RGBA')
+                    background = Image.new('RGB', img.size, (255, 255, 255))
+                    background.paste(img, mask=img.split()[-1])
+                    img = background
+                elif img.mode != 'RGB':
+                    img = img.convert('RGB')
+                
+                buffer = io.BytesIO()
+                img.save(buffer, format='JPEG', quality=85)
+                resized_bytes = buffer.getvalue()
+        except Exception as e:
+            print(f"⚠️  Could not resize image {image_hash}: {e}")
+            return image_bytes
+        
+        try:
+            os.makedirs(self.RESIZED_IMAGE_CACHE_DIR, exist_ok=True)
+            # Write to a private temp file and rename, so concurrent workers never see a partial file
+            temp_path = f"{resized_path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(resized_bytes)
+            os.replace(temp_path, resized_path)
+        except Exception as e:
+            print(f"⚠️  Could not cache resized image {image_hash}: {e}")
+        
+        return resized_bytes
+    
+    def _create_embedding(self, **kwargs):
+        """Call the embeddings endpoint under the rate limiter, backing off exponentially (with jitter) on rate limits."""
+        for attempt in range(self.MAX_RATE_LIMIT_RETRIES):
+            self._rate_limiter.acquire()
+            try:
+                return self.client.embeddings.create(**kwargs)
+            except openai.RateLimitError:
+                self._rate_limiter.throttle()
+                if attempt == self.MAX_RATE_LIMIT_RETRIES - 1:
+                    raise
+                delay = 2 ** attempt + random.random()
+                print(f"    ⏳ Rate limited, retrying in {delay:.1f}s")
+                time.sleep(delay)
+    
+    def _load_cached_embedding(self, image_hash: Optional[str]) -> Optional[List[float]]:
+        """Load a cached embedding for an image hash, or None on a miss."""
+        if not image_hash:
+            return None
+        
+        cache_path = os.path.join(self.embedding_cache_dir, image_hash + '.json')
+        if not os.path.exists(cache_path):
+            return None
+        
+        try:
+            with open(cache_path, 'r') as f:
+                return json.load(f)
+        except Exception:
+            return None
+    
+    def _save_cached_embedding(self, image_hash: Optional[str], embedding: List[float]):
+        """Persist an embedding under its image hash."""
+        if not image_hash:
+            return
+        
+        try:
+            os.makedirs(self.embedding_cache_dir, exist_ok=True)
+            cache_path = os.path.join(self.embedding_cache_dir, image_hash + '.json')
+            # Write to a private temp file and rename, so concurrent workers never see a partial entry
+            temp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(embedding, f)
+            os.replace(temp_path, cache_path)
+        except Exception as e:
+            print(f"⚠️  Could not cache embedding {image_hash}: {e}")
+    
     def get_image_embedding(self, image_path: str) -> Optional[List[float]]:
         """Get embedding for an image using CLIP model for direct image embeddings."""
         try:
-            if not self.client:
-                print("❌ OpenAI client not available")
+            # Read the file once; the same bytes feed both the cache key and the request
+            image_bytes = self._read_image(image_path)
+            if image_bytes is None:
                 return None
             
-            # Encode image to base64
-            base64_image = self.encode_image_to_base64(image_path)
-            if not base64_image:
+            # Serve unchanged images from the on-disk cache without calling OpenAI
+            image_hash = hashlib.sha1(image_bytes).hexdigest()
+            cached = self._load_cached_embedding(image_hash) if self.use_cache else None
+            if cached is not None:
+                print(f"    ♻️  Loaded cached embedding: {os.path.basename(image_path)}")
+                return cached
+            
+            if not self.client:
+                print("❌ OpenAI client not available")
                 return None
             
             # Use OpenAI's CLIP model for direct image embeddings
             print(f"    🔍 Embedding image: {os.path.basename(image_path)}")
             
-            response = self.client.embeddings.create(
-                model="clip-vit-base-patch32",  # CLIP model for image embeddings
-                input=f"data:image/png;base64,{base64_image}"
+            response = self._create_embedding(
+                model=self.IMAGE_EMBEDDING_MODEL,  # CLIP model for image embeddings
+                input=self._image_data_url(self._prepare_image(image_bytes, image_hash))
             )
             
             print(f"    ✅ Generated direct image embedding")
-            return response.data[0].embedding
+            embedding = response.data[0].embedding
+            # Filename fallbacks are not cached, so a later run retries the real image embedding
+            if self.use_cache:
+                self._save_cached_embedding(image_hash, embedding)
+            return embedding
             
         except Exception as e:
             print(f"❌ Error getting image embedding for {image_path}: {e}")
-            # Fallback to using image filename as text embedding
-            print(f"    ⚠️  Falling back to filename-based embedding")
+            return self._filename_embedding(image_path)
+    
+    def _filename_embedding(self, image_path: str) -> Optional[List[float]]:
+        """Fallback embedding of the image's filename as text, for images the CLIP model rejects."""
+        print(f"    ⚠️  Falling back to filename-based embedding")
+        try:
+            fallback_response = self._create_embedding(
+                model="text-embedding-3-small",
+                input=f"Furniture image: {os.path.basename(image_path)}"
+            )
+            return fallback_response.data[0].embedding
+        except Exception as fallback_error:
+            print(f"❌ Fallback also failed: {fallback_error}")
+            return None
+    
+    def get_image_embeddings_batch(self, image_paths: List[str]) -> List[Optional[List[float]]]:
+        """Get embeddings for several images, sending the uncached ones to OpenAI several per request.
+        
+        Returns one embedding (or None) per path, in the same order.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return self._embed_images(image_paths, executor)
+    
+    def _read_and_hash(self, image_path: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """Read an image and return (bytes, SHA-1 hex digest), or (None, None) if it cannot be read."""
+        image_bytes = self._read_image(image_path)
+        if image_bytes is None:
+            return None, None
+        return image_bytes, hashlib.sha1(image_bytes).hexdigest()
+    
+    def _embed_images(self, image_paths: List[str], executor: ThreadPoolExecutor) -> List[Optional[List[float]]]:
+        """Body of get_image_embeddings_batch; file reads, hashing, resizing and requests all run on `executor`."""
+        embeddings: List[Optional[List[float]]] = [None] * len(image_paths)
+        
+        # Reuse embeddings for images already embedded this run or cached on disk; identical
+        # files queue a single image, however many items share them
+        positions_by_hash: Dict[str, List[int]] = {}
+        pending = []
+        for position, (image_bytes, image_hash) in enumerate(executor.map(self._read_and_hash, image_paths)):
+            if image_bytes is None:
+                continue
+            
+            if image_hash in positions_by_hash:
+                positions_by_hash[image_hash].append(position)
+                continue
+            
+            cached = self._run_embeddings.get(image_hash)
+            if cached is None and self.use_cache:
+                cached = self._load_cached_embedding(image_hash)
+            if cached is not None:
+                self._run_embeddings[image_hash] = cached
+                embeddings[position] = cached
+            else:
+                positions_by_hash[image_hash] = [position]
+                pending.append((position, image_hash, image_bytes))
+        
+        cached_count = sum(embedding is not None for embedding in embeddings)
+        if cached_count:
+            print(f"    ♻️  Reused {cached_count} embeddings")
+        
+        duplicate_count = sum(len(positions) for positions in positions_by_hash.values()) - len(pending)
+        if duplicate_count:
+            print(f"    🔁 Skipping {duplicate_count} duplicate images")
+        
+        if not pending:
+            return embeddings
+        
+        if not self.client:
+            print("❌ OpenAI client not available")
+            return embeddings
+        
+        # Resize and encode the images in parallel
+        data_urls = executor.map(lambda entry: self._image_data_url(self._prepare_image(entry[2], entry[1])), pending)
+        pending = [(position, image_hash, data_url) for (position, image_hash, _), data_url in zip(pending, data_urls)]
+        
+        # Group pending images into requests capped by image count and payload size
+        requests = [[]]
+        request_bytes = 0
+        for entry in pending:
+            if requests[-1] and (len(requests[-1]) >= self.EMBEDDING_BATCH_SIZE or
+                                 request_bytes + len(entry[2]) > self.MAX_EMBEDDING_REQUEST_BYTES):
+                requests.append([])
+                request_bytes = 0
+            requests[-1].append(entry)
+            request_bytes += len(entry[2])
+        
+        def record(image_hash: str, embedding: List[float]):
+            # Fan the embedding out to every item sharing this image
+            for duplicate in positions_by_hash[image_hash]:
+                embeddings[duplicate] = embedding
+            self._run_embeddings[image_hash] = embedding
+            if self.use_cache:
+                self._save_cached_embedding(image_hash, embedding)
+        
+        def embed_request(entries):
             try:
-                fallback_response = self.client.embeddings.create(
-                    model="text-embedding-3-small",
-                    input=f"Furniture image: {os.path.basename(image_path)}"
+                response = self._create_embedding(
+                    model=self.IMAGE_EMBEDDING_MODEL,
+                    input=[data_url for _, _, data_url in entries]
                 )
-                return fallback_response.data[0].embedding
-            except Exception as fallback_error:
-                print(f"❌ Fallback also failed: {fallback_error}")
-                return None
+            except Exception as e:
+                print(f"❌ Error getting batched image embeddings: {e}")
+                # Retry the images one at a time so a single bad image doesn't sink the whole request
+                for position, image_hash, data_url in entries:
+                    try:
+                        response = self._create_embedding(model=self.IMAGE_EMBEDDING_MODEL, input=data_url)
+                        record(image_hash, response.data[0].embedding)
+                    except Exception as single_error:
+                        print(f"❌ Error getting image embedding for {image_paths[position]}: {single_error}")
+                        # Filename fallbacks are not recorded, so a later run retries the real image embedding
+                        embedding = self._filename_embedding(image_paths[position])
+                        for duplicate in positions_by_hash[image_hash]:
+                            embeddings[duplicate] = embedding
+                return
+            
+            for (_, image_hash, _), data in zip(entries, sorted(response.data, key=lambda d: d.index)):
+                record(image_hash, data.embedding)
+            print(f"    ✅ Generated {len(entries)} image embeddings in one request")
+        
+        # Requests run concurrently (the OpenAI client is thread-safe)
+        list(executor.map(embed_request, requests))
+        
+        return embeddings
+    
+    def _build_vector(self, item: Dict, image_path: str, embedding: List[float]) -> Dict:
+        """Build the Pinecone vector for an item from its image embedding."""
+        return {
+            'id': item['catalog_number'],
+            'values': embedding,
+            'metadata': {
+                'item_name': item['item_name'],
+                'item_type': item['item_type'],
+                'price': item['price'],
+                'color': item['color'],
+                'image_url': item['image_url'],
+                'link': item['link'],
+                'image_path': image_path
+            }
+        }
+    
+    def _upsert_batch(self, vectors: List[Dict], counts: Dict[str, int], lock: threading.Lock,
+                      in_flight: threading.BoundedSemaphore):
+        """Upsert one batch of vectors and record the outcome; frees an in-flight slot when done."""
+        try:
+            self.index.upsert(vectors=vectors)
+            with lock:
+                counts['successful'] += len(vectors)
+            print(f"✅ Upserted {len(vectors)} vectors to Pinecone")
+        except Exception as e:
+            with lock:
+                counts['failed'] += len(vectors)
+            print(f"❌ Error upserting batch to Pinecone: {e}")
+        finally:
+            in_flight.release()
     
     def upsert_to_pinecone(self, items: List[Dict], batch_size: int = 100):
         """Upsert items to Pinecone database."""
@@ -268,66 +637,54 @@ class ImageVectorizationPinecone:
             
             print(f"📤 Upserting {len(items)} items to Pinecone in batches of {batch_size}")
             
-            successful_upserts = 0
-            failed_upserts = 0
-            
-            for i in range(0, len(items), batch_size):
-                batch = items[i:i + batch_size]
-                vectors_to_upsert = []
-                
-                print(f"🔄 Processing batch {i//batch_size + 1}/{(len(items) + batch_size - 1)//batch_size}")
-                
-                for item in batch:
-                    try:
-                        # Find image path
+            self._run_embeddings = {}
+            counts = {'successful': 0, 'failed': 0}
+            lock = threading.Lock()
+            # Caps how many finished batches may wait on Pinecone before embedding pauses
+            in_flight = threading.BoundedSemaphore(self.MAX_INFLIGHT_UPSERTS)
+            upsert_futures = []
+            
+            # Finished batches go to Pinecone in the background, so batch N is written
+            # while batch N+1 is being embedded
+            with ThreadPoolExecutor(max_workers=self.MAX_UPSERT_WORKERS) as upsert_executor:
+                for i in range(0, len(items), batch_size):
+                    batch = items[i:i + batch_size]
+                    
+                    print(f"🔄 Processing batch {i//batch_size + 1}/{(len(items) + batch_size - 1)//batch_size}")
+                    
+                    # Find image paths
+                    found = []
+                    for item in batch:
                         image_path = self.find_image_path(item)
-                        if not image_path:
+                        if image_path:
+                            found.append((item, image_path))
+                        else:
                             print(f"⚠️  No image found for {item['catalog_number']}")
-                            failed_upserts += 1
-                            continue
-                        
-                        # Get embedding
-                        embedding = self.get_image_embedding(image_path)
+                    
+                    # Embed the batch's images together, several per request
+                    embeddings = self.get_image_embeddings_batch([image_path for _, image_path in found])
+                    
+                    vectors_to_upsert = []
+                    for (item, image_path), embedding in zip(found, embeddings):
                         if not embedding:
                             print(f"⚠️  Failed to get embedding for {item['catalog_number']}")
-                            failed_upserts += 1
                             continue
-                        
-                        # Prepare vector for upsert
-                        vector_data = {
-                            'id': item['catalog_number'],
-                            'values': embedding,
-                            'metadata': {
-                                'item_name': item['item_name'],
-                                'item_type': item['item_type'],
-                                'price': item['price'],
-                                'color': item['color'],
-                                'image_url': item['image_url'],
-                                'link': item['link'],
-                                'image_path': image_path
-                            }
-                        }
-                        
-                        vectors_to_upsert.append(vector_data)
-                        successful_upserts += 1
-                        
-                        # Small delay to avoid rate limiting
-                        time.sleep(0.1)
-                        
-                    except Exception as e:
-                        print(f"❌ Error processing {item['catalog_number']}: {e}")
-                        failed_upserts += 1
-                        continue
+                        vectors_to_upsert.append(self._build_vector(item, image_path, embedding))
+                    
+                    with lock:
+                        counts['failed'] += len(batch) - len(vectors_to_upsert)
+                    
+                    # Upsert batch to Pinecone without waiting for it
+                    if vectors_to_upsert:
+                        in_flight.acquire()
+                        upsert_futures.append(upsert_executor.submit(
+                            self._upsert_batch, vectors_to_upsert, counts, lock, in_flight
+                        ))
                 
-                # Upsert batch to Pinecone
-                if vectors_to_upsert:
-                    try:
-                        self.index.upsert(vectors=vectors_to_upsert)
-                        print(f"✅ Upserted {len(vectors_to_upsert)} vectors to Pinecone")
-                    except Exception as e:
-                        print(f"❌ Error upserting batch to Pinecone: {e}")
-                        failed_upserts += len(vectors_to_upsert)
-                        successful_upserts -= len(vectors_to_upsert)
+                wait(upsert_futures)
+            
+            successful_upserts = counts['successful']
+            failed_upserts = counts['failed']
             
             print(f"\n📊 Upsert Summary:")
             print(f"   ✅ Successful: {successful_upserts}")
@@ -383,11 +740,12 @@ def main():
     config.print_status()
     
     # Validate API keys
-    if not config.validate_keys()['openai']:
+    keys = config.validate_keys()
+    if not keys['openai']:
         print("❌ OpenAI API key not found. Please set it in config.json or environment.")
         return
     
-    if not config.validate_keys()['pinecone']:
+    if not keys['pinecone']:
         print("❌ Pinecone API key not found. Please set it in config.json or environment.")
         return
     
@@ -6,10 +6,15 @@ Compiles essential data from individual CSV files without AI descriptions
 
 import os
 import csv
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
+import pandas as pd
 from config import Config
 
 class MasterCatalogUpdater:
+    # Fields read from each category CSV
+    CATEGORY_FIELDS = ['catalog_number', 'item_name', 'item_type', 'price', 'colors', 'image_url', 'link']
+    
     def __init__(self, catalog_type: str = "interior_define", config: Config = None):
         """Initialize the master catalog updater."""
         if config is None:
@@ -182,50 +187,37 @@ class MasterCatalogUpdater:
             return []
         
         try:
-            with open(csv_path, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                items = []
-                for row in reader:
-                    # Convert colors string back to list
-                    colors_str = row.get('colors', '')
-                    colors = [c.strip() for c in colors_str.split(',')] if colors_str else []
-                    
-                    items.append({
-                        'catalog_number': row.get('catalog_number', ''),
-                        'item_name': row.get('item_name', ''),
-                        'item_type': row.get('item_type', ''),
-                        'price': row.get('price', ''),
-                        'colors': colors,
-                        'image_url': row.get('image_url', ''),
-                        'link': row.get('link', '')
-                    })
-                
-                return items
-                
+            # Parse with pandas' C engine; every field stays a string and empty fields stay ''
+            df = pd.read_csv(csv_path, dtype=str, keep_default_na=False, encoding='utf-8')
+            df = df.reindex(columns=self.CATEGORY_FIELDS, fill_value='')
+            
+            # Convert colors string back to list
+            df['colors'] = df['colors'].map(lambda colors_str: [c.strip() for c in colors_str.split(',')] if colors_str else [])
+            
+            return df.to_dict('records')
+            
         except Exception as e:
             print(f"❌ Error loading {category_name} data: {e}")
             return []
 
     def save_master_catalog(self, items: List[Dict]):
         """Save master catalog with the new simplified structure."""
-        with open(self.master_csv_path, 'w', newline='', encoding='utf-8') as csvfile:
+        # A 1 MiB buffer lets the file be written in a few large chunks
+        with open(self.master_csv_path, 'w', newline='', encoding='utf-8', buffering=1 << 20) as csvfile:
             fieldnames = ['catalog_number', 'item_name', 'item_type', 'price', 'color', 'image_url', 'link']
             writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
             writer.writeheader()
             
-            for item in items:
+            writer.writerows({
+                'catalog_number': item.get('catalog_number', ''),
+                'item_name': item.get('item_name', ''),
+                'item_type': item.get('item_type', ''),
+                'price': item.get('price', ''),
                 # Format colors as a single string
-                color_str = ', '.join(item.get('colors', [])) if item.get('colors') else 'Standard finish'
-                
-                writer.writerow({
-                    'catalog_number': item.get('catalog_number', ''),
-                    'item_name': item.get('item_name', ''),
-                    'item_type': item.get('item_type', ''),
-                    'price': item.get('price', ''),
-                    'color': color_str,
-                    'image_url': item.get('image_url', ''),
-                    'link': item.get('link', '')
-                })
+                'color': ', '.join(item['colors']) if item.get('colors') else 'Standard finish',
+                'image_url': item.get('image_url', ''),
+                'link': item.get('link', '')
+            } for item in items)
 
     def create_master_catalog(self):
         """Create master catalog from individual category CSV files."""
@@ -234,14 +226,17 @@ class MasterCatalogUpdater:
         print("📋 Compiling essential data from individual CSV files")
         print("🚫 No AI descriptions - focusing on core data only")
         
-        # Load fresh data from individual CSV files
+        # Load fresh data from individual CSV files, reading all categories at once
         all_items = []
         total_categories = len(self.categories)
         
-        for i, (category_name, category_info) in enumerate(self.categories.items(), 1):
+        with ThreadPoolExecutor(max_workers=total_categories) as executor:
+            # map keeps results in category order
+            category_items = list(executor.map(self.load_category_data, self.categories))
+        
+        for i, (category_name, items) in enumerate(zip(self.categories, category_items), 1):
             print(f"\n📁 Processing {category_name} ({i}/{total_categories})...")
             
-            items = self.load_category_data(category_name)
             if items:
                 print(f"   ✅ Loaded {len(items)} items")
                 all_items.extend(items)
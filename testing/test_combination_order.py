@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Test script for the furniture combination ranking
+
+Checks that combinations with equal total similarity keep itertools.product order,
+including at the top_k cutoff, as the original Python sort did.
+"""
+
+import itertools
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import furniture_combination_optimizer
+from furniture_combination_optimizer import FurnitureCombinationOptimizer
+
+
+def expected_order(type_sims, type_prices, budget, top_k):
+    """Reference ranking: enumerate with itertools.product and stable-sort by similarity."""
+    combinations = []
+    for selection in itertools.product(*[range(len(sims)) for sims in type_sims]):
+        total_price = sum(type_prices[t][k] for t, k in enumerate(selection))
+        if 0 < total_price <= budget:
+            combinations.append((sum(type_sims[t][k] for t, k in enumerate(selection)), selection))
+    combinations.sort(key=lambda x: x[0], reverse=True)
+    return [selection for _, selection in combinations[:top_k]]
+
+
+def test_equal_scores_keep_product_order():
+    """Tied combinations come out in enumeration order, whichever scoring path runs."""
+    optimizer = FurnitureCombinationOptimizer.__new__(FurnitureCombinationOptimizer)
+    optimizer.budget = 1000.0
+
+    # Every combination of the first two options ties; the third option of each type is worse
+    type_sims = [np.array([0.5, 0.5, 0.1]), np.array([0.25, 0.25, 0.1]), np.array([0.125, 0.125, 0.125])]
+    type_prices = [np.array([100.0, 200.0, 300.0]), np.array([100.0, 100.0, 100.0]), np.array([50.0, 50.0, 2000.0])]
+
+    numba_available = furniture_combination_optimizer.NUMBA_AVAILABLE
+    try:
+        for use_numba in sorted({False, numba_available}):
+            furniture_combination_optimizer.NUMBA_AVAILABLE = use_numba
+            for top_k in (1, 3, 5, 8, 100):
+                best = optimizer._top_combinations_vectorized(type_sims, type_prices, top_k)
+                selections = [selection for _, _, selection in best]
+                assert selections == expected_order(type_sims, type_prices, optimizer.budget, top_k), \
+                    f"order differs (numba={use_numba}, top_k={top_k}): {selections}"
+    finally:
+        furniture_combination_optimizer.NUMBA_AVAILABLE = numba_available
+
+    print("✅ Tied combinations keep itertools.product order")
+
+
+if __name__ == "__main__":
+    test_equal_scores_keep_product_order()